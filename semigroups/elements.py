@@ -5,6 +5,12 @@ This module contains classes for representing elements of semigroups.
 # pylint: disable = too-few-public-methods
 
 import libsemigroups
+from libsemigroups import normalise_labels
+# only imported to be re-exported by the package, see __init__.py
+# pylint: disable = unused-import
+from libsemigroups import multiply_many  # noqa: F401
+# pylint: enable = unused-import
+
 
 class Transformation(libsemigroups.TransformationNC):
     '''
@@ -66,6 +72,11 @@ class PartialPerm(libsemigroups.PartialPermNC):
         args (list):    List containing the domain, as a list of ints, then the
                         range, as a list of ints, then the degree.
 
+    Iterating over a partial permutation gives its images, with 65535 for the
+    undefined images (or 4294967295 if the degree exceeds 65535). The array
+    returned by ``as_array`` uses the largest value of its dtype instead,
+    which depends on the degree.
+
     Raises:
         TypeError:  During the second arg format, if the domain or range are
                     not both lists, the degree is not an int, or the elements
@@ -81,6 +92,11 @@ class PartialPerm(libsemigroups.PartialPermNC):
         PartialPerm([1, 2, 5], [2, 3, 5], 6)
     '''
 
+    # the domain and range are computed when first required, for instances
+    # which are not created by __init__ (such as those from from_images)
+    _domain = None
+    _range = None
+
     def __init__(self, *args):
         if len(args) == 1 and isinstance(args[0], libsemigroups.ElementABC):
             # construct an uninitialised PartialPerm
@@ -121,27 +137,27 @@ class PartialPerm(libsemigroups.PartialPermNC):
         else:
             self._domain, self._range = zip(*sorted(zip(args[0], args[1])))
             self._domain, self._range = list(self._domain), list(self._range)
-        images = [65535] * args[2]
+        images = [-1] * args[2]
 
         for i in range(len(self._domain)):
             images[self._domain[i]] = self._range[i]
         libsemigroups.PartialPermNC.__init__(self, images)
 
+    def _clear_caches(self):
+        self._domain = None
+        self._range = None
+
     def _init_dom_ran(self):
         if self._domain is None or self._range is None:
-            self._domain, self._range = [], []
-            images = [i for i in self]
-            for i in range(self.degree()):
-                if images[i] != 65535 and images[i] != -1:
-                    self._domain.append(i)
-                    self._range.append(images[i])
+            self._domain = self.domain_array().tolist()
+            self._range = self.range_array().tolist()
 
     def __repr__(self):
         self._init_dom_ran()
         return ('PartialPerm(%s, %s, %s)'
                 % (self._domain,
                    self._range,
-                   self.degree())).replace('65535', '-')
+                   self.degree()))
 
     def domain(self):
         '''
@@ -208,6 +224,9 @@ class Bipartition(libsemigroups.BipartitionNC):
         Bipartition([[1, -1], [2, 3, -2], [-3]])
     '''
 
+    # the blocks are computed when first required
+    _blocks = None
+
     def __init__(self, *args):
         if len(args) == 1:
             if isinstance(args[0], libsemigroups.ElementABC):
@@ -225,38 +244,29 @@ class Bipartition(libsemigroups.BipartitionNC):
         elif not all(isinstance(i, int) and i != 0 for x in args for i in x):
             raise TypeError('the arguments must be lists of non-zero integers')
 
-        copy = set().union(*args)
-        n = max(copy)
-
-        if (len(copy) != 0
-                and copy != set(range(1, n + 1)).
-                union(set(range(-1, -1 * n - 1, -1)))):
+        # label the points 1, ..., n, -1, ..., -n by the index of their block;
+        # there are 2n points in total, so every point occurs exactly once if
+        # and only if every label is set
+        nr_points = sum(len(x) for x in args)
+        n = nr_points // 2
+        labels = [-1] * (2 * n)
+        for label, block in enumerate(args):
+            for i in block:
+                if 0 < i <= n:
+                    labels[i - 1] = label
+                elif -n <= i < 0:
+                    labels[n - i - 1] = label
+
+        if n == 0 or 2 * n != nr_points or -1 in labels:
+            n = max([0] + [i for x in args for i in x])
             raise ValueError('the union of the arguments must be '
                              + '[-%s .. -1, 1 .. %s],' % (n, n))
 
-        copy = [x[:] for x in args]
-        for i in range(len(copy)):
-            for j in range(len(copy[i])):
-                if copy[i][j] < 0:
-                    copy[i][j] = abs(copy[i][j]) + n
-
-        copy = [sorted(x) for x in copy]
-        copy.sort()
+        libsemigroups.BipartitionNC.__init__(
+            self, normalise_labels(labels))
 
-        lookup = [0] * 2 * n
-        next_block = 0
-        for i in range(len(copy)):
-            for j in copy[i]:
-                lookup[j - 1] = next_block
-            next_block += 1
-
-        for i in range(len(copy)):
-            for j in range(len(copy[i])):
-                if copy[i][j] > n:
-                    copy[i][j] = -1 * copy[i][j] + n
-
-        self._blocks = copy
-        libsemigroups.BipartitionNC.__init__(self, lookup)
+    def _clear_caches(self):
+        self._blocks = None
 
     def block(self, index):
         '''
@@ -311,15 +321,12 @@ class Bipartition(libsemigroups.BipartitionNC):
         '''
         if self._blocks is None:
             blocks = [[] for i in range(self.nr_blocks())]
-            n = self.degree()
-            for i in range(1, n + 1):
-                val = self.block(i)
-                assert val < len(blocks)
-                blocks[val].append(i)
-            for i in range(-1, - n - 1, -1):
-                val = self.block(i)
-                assert val < len(blocks)
-                blocks[val].append(i)
+            lookup = list(self)
+            n = len(lookup) // 2
+            for i in range(n):
+                blocks[lookup[i]].append(i + 1)
+            for i in range(n):
+                blocks[lookup[n + i]].append(-i - 1)
             self._blocks = blocks
         return self._blocks
 
@@ -348,6 +355,10 @@ class BooleanMat(libsemigroups.BooleanMatNC):
         BooleanMat([[1, 1], [0, 1]])
     '''
 
+    # the rows are computed when first required, for instances which are not
+    # created by __init__ (such as those from from_numpy)
+    _rows = None
+
     def __init__(self, *args):
         if len(args) == 0:
             raise ValueError('there must be at least 1 argument')
@@ -380,6 +391,9 @@ class BooleanMat(libsemigroups.BooleanMatNC):
 
         libsemigroups.BooleanMatNC.__init__(self, self._rows)
 
+    def _clear_caches(self):
+        self._rows = None
+
     def __getitem__(self, i):
         n = self.degree()
         if i >= n:
@@ -444,6 +458,11 @@ class PBR(libsemigroups.PBRNC):
         PBR([[1], [-1, 1, 2]], [[1], [-1, 1, 2]])
     """
 
+    # the out-neighbours are computed when first required, for instances which
+    # are not created by __init__ (such as those from from_bytes)
+    __pos_out_neighbours = None
+    __neg_out_neighbours = None
+
     def __init__(self, *args):
         if len(args) == 1:
             if isinstance(args[0], libsemigroups.ElementABC):
@@ -493,6 +512,10 @@ class PBR(libsemigroups.PBRNC):
 
         libsemigroups.PBRNC.__init__(self, int_rep)
 
+    def _clear_caches(self):
+        self.__pos_out_neighbours = None
+        self.__neg_out_neighbours = None
+
     def __repr__(self):
         if (self.__neg_out_neighbours is None or
                 self.__pos_out_neighbours is None):
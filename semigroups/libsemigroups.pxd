@@ -7,12 +7,13 @@
 
 from libc.stdint cimport uint16_t
 from libc.stdint cimport uint32_t
+from libc.stdint cimport uint64_t
 from libcpp.vector cimport vector
 from libcpp.pair cimport pair
 from libcpp cimport bool
 from libcpp.string cimport string
 
-cdef extern from "<libsemigroups/elements.h>" namespace "libsemigroups":
+cdef extern from "<libsemigroups/elements.h>" namespace "libsemigroups" nogil:
     cdef cppclass Element:
         Element* identity()
         void redefine(Element *, Element *)
@@ -20,7 +21,9 @@ cdef extern from "<libsemigroups/elements.h>" namespace "libsemigroups":
         bool operator<(Element&)
         Element* really_copy()
         void really_delete()
+        void copy(Element *)
         int degree()
+        size_t hash_value()
     cdef cppclass Transformation[T](Element):
         Transformation(vector[T]) except +
         vector[T] _vector
@@ -58,6 +61,9 @@ cdef extern from "libsemigroups_cpp.h" namespace "libsemigroups":
     cdef cppclass PythonElement(Element):
         object get_value()
         PythonElement(value) except +
+    cdef cppclass PackedBooleanMat(Element):
+        PackedBooleanMat(vector[uint64_t]) except +
+        uint64_t* data() nogil
 
 cdef extern from "<libsemigroups/semigroups.h>" namespace "libsemigroups":
     cdef cppclass Semigroup:
@@ -65,16 +71,30 @@ cdef extern from "<libsemigroups/semigroups.h>" namespace "libsemigroups":
         Semigroup(vector[Element*]) except +
         int size()
         int nridempotents()
+        bool is_idempotent(size_t pos) nogil
         Element* at(size_t pos)  # pos_t
         void set_report(bool val)
         int current_max_word_length()
         int current_position(Element* x)
-        int position(Element* x)
+        size_t position(Element* x) nogil
         bool is_done()
         bool is_begun()
-        bool test_membership(Element* x)
+        bool test_membership(Element* x) nogil
         vector[size_t]* factorisation(size_t pos)
-        void enumerate(size_t limit)
+        void enumerate(size_t limit) nogil
+        size_t current_size()
+        size_t batch_size()
+        void set_max_threads(size_t nr_threads)
+        size_t nrgens()
+        size_t right(size_t pos, size_t letter) nogil
+        size_t left(size_t pos, size_t letter) nogil
+        size_t prefix(size_t pos) nogil
+        size_t suffix(size_t pos) nogil
+        size_t first_letter(size_t pos) nogil
+        size_t final_letter(size_t pos) nogil
+        size_t length_const(size_t pos) nogil
+        size_t letter_to_pos(size_t letter) nogil
+        size_t fast_product(size_t i, size_t j) nogil
 
 cdef extern from "<libsemigroups/cong.h>" namespace "libsemigroups":
     cdef cppclass Congruence:
@@ -82,7 +102,7 @@ cdef extern from "<libsemigroups/cong.h>" namespace "libsemigroups":
                    size_t, 
                    vector[pair[vector[size_t],vector[size_t]]],
                    vector[pair[vector[size_t],vector[size_t]]]) except +
-        int nr_classes()
+        int nr_classes() nogil
         int word_to_class_index(vector[size_t] word)
         void set_report(bool val)
         void set_max_threads(size_t nr_threads)
@@ -22,14 +22,157 @@ We construct the semigroup generated by `0` and complex number `i`::
 """
 cimport libsemigroups
 
-from libc.stdint cimport uint16_t
+from libc.stdint cimport uint8_t, uint16_t
 from libcpp.vector cimport vector
 from libcpp cimport bool
 from libcpp.string cimport string
 from libcpp.pair cimport pair
 from libc.stdint cimport uint32_t
-
-from cysignals.signals cimport sig_on, sig_off
+from libc.stdint cimport int64_t, uint64_t
+from libc.string cimport memcpy
+from cpython.buffer cimport PyBUF_WRITABLE, PyBUF_FORMAT, PyBUF_ND
+
+from cython.operator cimport dereference as deref
+from cython.operator cimport preincrement as inc
+
+from cysignals.signals cimport sig_on, sig_off, sig_check
+
+import numpy
+import struct
+import threading
+
+# Transformations and partial perms store their images using the narrowest of
+# these types which fits their degree, see _image_width.
+ctypedef fused image_t:
+    uint8_t
+    uint16_t
+    uint32_t
+
+cdef inline size_t _image_width(size_t degree) noexcept nogil:
+    # The number of bytes used to store each image of a transformation or
+    # partial perm of the given degree. The largest value of each type is
+    # reserved for the undefined images of partial perms.
+    if degree <= 0xFF:
+        return 1
+    elif degree <= 0xFFFF:
+        return 2
+    return 4
+
+# The undefined image of a partial perm in the lists of images returned by
+# iterating over it, which is 65535, as it was when the images were always
+# stored as uint16, unless the degree exceeds 65535, in which case it is the
+# largest value of uint32.
+_UNDEFINED_IMAGE = 0xFFFF
+
+def _image_dtype(size_t degree):
+    return {1: numpy.uint8, 2: numpy.uint16, 4: numpy.uint32}[
+        _image_width(degree)]
+
+cdef void* _images(libsemigroups.Element* x, bint partial) noexcept nogil:
+    # The address of the first image of the transformation or partial perm x,
+    # whose images are stored contiguously, or NULL if x has degree 0.
+    cdef size_t width = _image_width(x.degree())
+    if x.degree() == 0:
+        return NULL
+    elif partial and width == 1:
+        return &deref((<libsemigroups.PartialPerm[uint8_t] *>x).begin())
+    elif partial and width == 2:
+        return &deref((<libsemigroups.PartialPerm[uint16_t] *>x).begin())
+    elif partial:
+        return &deref((<libsemigroups.PartialPerm[uint32_t] *>x).begin())
+    elif width == 1:
+        return &deref((<libsemigroups.Transformation[uint8_t] *>x).begin())
+    elif width == 2:
+        return &deref((<libsemigroups.Transformation[uint16_t] *>x).begin())
+    return &deref((<libsemigroups.Transformation[uint32_t] *>x).begin())
+
+cdef void _load_images(image_t* images, size_t n, bint partial,
+                       vector[size_t]& out) noexcept nogil:
+    cdef size_t i
+    out.resize(n)
+    for i in range(n):
+        if partial and images[i] == <image_t> -1:
+            out[i] = <size_t> -1
+        else:
+            out[i] = images[i]
+
+cdef void _store_images(image_t* images,
+                        vector[size_t]& values) noexcept nogil:
+    cdef size_t i
+    for i in range(values.size()):
+        images[i] = <image_t> values[i]
+
+cdef void _invert_images(image_t* images, image_t* out,
+                         size_t n) noexcept nogil:
+    # Write the images of the inverse of the partial perm with the given
+    # images into out.
+    cdef size_t i
+    for i in range(n):
+        out[i] = <image_t> -1
+    for i in range(n):
+        if images[i] != <image_t> -1:
+            out[images[i]] = <image_t> i
+
+cdef bint _is_restriction(image_t* f, image_t* g, size_t n) noexcept nogil:
+    # Check that g agrees with f on the domain of f, where f and g are the
+    # images of partial perms.
+    cdef size_t i
+    for i in range(n):
+        if f[i] != <image_t> -1 and f[i] != g[i]:
+            return False
+    return True
+
+cdef void _get_images(libsemigroups.Element* x, bint partial,
+                      vector[size_t]& out) noexcept nogil:
+    # Copy the images of the transformation or partial perm x into out, where
+    # undefined images are <size_t> -1, whatever the width of x.
+    cdef size_t n = x.degree(), width = _image_width(n)
+    cdef void* images = _images(x, partial)
+    if width == 1:
+        _load_images(<uint8_t *>images, n, partial, out)
+    elif width == 2:
+        _load_images(<uint16_t *>images, n, partial, out)
+    else:
+        _load_images(<uint32_t *>images, n, partial, out)
+
+cdef void _set_images(libsemigroups.Element* x, bint partial,
+                      vector[size_t]& values) noexcept nogil:
+    # The inverse of _get_images; x must have degree values.size().
+    cdef size_t width = _image_width(x.degree())
+    cdef void* images = _images(x, partial)
+    if width == 1:
+        _store_images(<uint8_t *>images, values)
+    elif width == 2:
+        _store_images(<uint16_t *>images, values)
+    else:
+        _store_images(<uint32_t *>images, values)
+
+cdef int _get_images_buffer(ElementABC x, bint partial, Py_buffer* buffer,
+                            int flags, Py_ssize_t* shape) except -1:
+    # Fill in <buffer> so that it is a read-only, one dimensional view of the
+    # images of the transformation or partial perm <x>, without copying them.
+    if flags & PyBUF_WRITABLE:
+        raise BufferError('the images of an element are read-only')
+    cdef size_t width = _image_width(x._handle.degree())
+    shape[0] = x._handle.degree()
+    buffer.buf = _images(x._handle, partial)
+    buffer.obj = x
+    buffer.len = shape[0] * width
+    buffer.readonly = 1
+    buffer.itemsize = width
+    if flags & PyBUF_FORMAT:
+        buffer.format = 'B' if width == 1 else 'H' if width == 2 else 'I'
+    else:
+        buffer.format = NULL
+    buffer.ndim = 1
+    buffer.shape = shape if flags & PyBUF_ND else NULL
+    # the buffer is C-contiguous, for which NULL strides are allowed even if
+    # strides are requested
+    buffer.strides = NULL
+    buffer.suboffsets = NULL
+    buffer.internal = NULL
+    x._nr_exports += 1
+    return 0
 
 cdef class ElementABC:
     """
@@ -37,35 +180,208 @@ cdef class ElementABC:
 
     Any subclass shall implement an ''__init__'' method which
     initializes _handle.
+
+    Elements are mutable: ``*=`` and ``product_into`` change an element in
+    place, and a subclass which caches anything computed from _handle shall
+    override ``_clear_caches``.
     """
     cdef libsemigroups.Element* _handle
+    # If _owns_handle is False, then _handle belongs to _parent (for example,
+    # it is an element of a Semigroup) and this instance is a view of it;
+    # _handle is copied before this instance is first changed.
+    cdef bint _owns_handle
+    cdef object _parent
+    # A spare element of the same degree, or NULL, into which products with
+    # self as a factor are written, see _redefine.
+    cdef libsemigroups.Element* _scratch
+    # The number of buffers exporting the data of _handle, which cannot be
+    # changed while this is positive.
+    cdef Py_ssize_t _nr_exports
 
     def __cinit__(self):
         self._handle = NULL
+        self._owns_handle = True
+        self._parent = None
+        self._scratch = NULL
+        self._nr_exports = 0
     
     cdef new_from_handle(self, libsemigroups.Element* handle):
-        cdef ElementABC result = self.__class__(self)
-        result._handle = handle[0].really_copy()
+        return self.wrap_handle(handle[0].really_copy())
+
+    cdef new_view(self, libsemigroups.Element* handle, parent):
+        # Like new_from_handle, but the result is a view of <handle>, which
+        # belongs to <parent>, instead of a copy of it.
+        cdef ElementABC result = self.__class__.__new__(self.__class__)
+        result._handle = handle
+        result._owns_handle = False
+        result._parent = parent
+        return result
+
+    cdef _check_not_exported(self):
+        if self._nr_exports > 0:
+            raise BufferError('an element cannot be changed while its data '
+                              + 'is exported, for example by as_array')
+
+    cdef _detach(self):
+        # Prepare self to be changed in place: check that its data is not
+        # exported, and copy the handle of a view. The parent is kept, since
+        # views are cheap to keep alive.
+        self._check_not_exported()
+        if not self._owns_handle:
+            self._handle = self._handle.really_copy()
+            self._owns_handle = True
+
+    def _clear_caches(self):
+        # Called after self has been changed in place, to discard anything
+        # computed from its old value.
+        pass
+
+    def copy(self):
+        '''
+        Function for copying an element.
+
+        The elements returned by indexing or iterating over a semigroup are
+        views of the elements stored by the semigroup, which are only copied
+        when they are changed (for example, by ``*=``). This function returns
+        an independent copy.
+
+        Args:
+            None
+
+        Returns:
+            ElementABC: A copy of the element
+
+        Example:
+            >>> from semigroups import Transformation
+            >>> x = Transformation([1, 0, 1])
+            >>> y = x.copy()
+            >>> y *= y
+            >>> x, y
+            (Transformation([1, 0, 1]), Transformation([0, 1, 0]))
+        '''
+        cdef ElementABC result
+        if self._handle == NULL:
+            # as in __imul__, the attributes of subclasses which do not wrap a
+            # libsemigroups element are copied instead
+            result = self.__class__.__new__(self.__class__)
+            result.__dict__.update(self.__dict__)
+            return result
+        return self.new_from_handle(self._handle)
+
+    cdef wrap_handle(self, libsemigroups.Element* handle):
+        # Like new_from_handle, but the result takes ownership of <handle>
+        # rather than a copy of it. As in new_view, __init__ is not run, so
+        # that wrapping a product does not cost a call into Python.
+        cdef ElementABC result = self.__class__.__new__(self.__class__)
+        result._handle = handle
         return result
     
     def __dealloc__(self):
-        if self._handle != NULL:
+        if self._handle != NULL and self._owns_handle:
             self._handle[0].really_delete()
             del self._handle
+        if self._scratch != NULL:
+            self._scratch.really_delete()
+            del self._scratch
 
     def __mul__(ElementABC self, ElementABC other):
-        if not isinstance(self, type(other)):
-            raise TypeError('Elements must be same type')
-        elif self.degree() != other.degree():
-            raise ValueError('Element degrees must be equal')
+        _check_compatible(self, other)
         cdef libsemigroups.Element* product = self._handle.identity()
         product.redefine(self._handle, other._handle)
-        return self.new_from_handle(product)
-  
-    def __richcmp__(ElementABC self, ElementABC other, int op):
-        if not isinstance(self, type(other)):
+        return self.wrap_handle(product)
+
+    def __imul__(ElementABC self, ElementABC other):
+        '''
+        Multiply an element in place by another.
+
+        Unlike ``x = x * y``, ``x *= y`` changes the element ``x`` itself,
+        so every reference to ``x`` sees its new value. In particular, an
+        element must not be changed in place while it belongs to a set or is
+        a key of a dict, since its hash value changes with it. An element
+        cannot be changed while its data is exported, for example by
+        ``as_array``; the elements of a semigroup are copied when a view of
+        them is first changed.
+
+        Raises:
+            TypeError:      If the elements are not of the same type.
+            ValueError:     If the elements are not of the same degree.
+            BufferError:    If the data of the element is exported.
+        '''
+        if self._handle == NULL:
+            # subclasses which do not wrap a libsemigroups element, such as
+            # the elements of finitely presented semigroups, are multiplied
+            # by their own __mul__
+            return self * other
+        _check_compatible(self, other)
+        self._redefine(self, other)
+        return self
+
+    cdef _redefine(self, ElementABC x, ElementABC y):
+        # Overwrite the value of self with x * y; x and y may be self. If they
+        # are, or self is a view, then the product is written to the spare
+        # element _scratch, which is swapped with _handle, so that repeated
+        # calls do not allocate any elements.
+        cdef libsemigroups.Element* old
+        self._check_not_exported()
+        if self._owns_handle and x is not self and y is not self:
+            self._handle.redefine(x._handle, y._handle)
+        else:
+            if self._scratch == NULL:
+                self._scratch = self._handle.identity()
+            self._scratch.redefine(x._handle, y._handle)
+            old, self._handle = self._handle, self._scratch
+            # the handle of a view belongs to its parent
+            self._scratch = old if self._owns_handle else NULL
+            self._owns_handle = True
+        self._clear_caches()
+
+    def product_into(self, ElementABC x, ElementABC y):
+        '''
+        Function for overwriting an element with the product of two others.
+
+        After ``z.product_into(x, y)`` the value of ``z`` is ``x * y``; the
+        storage of ``z`` is reused, so no new element is created. Either of
+        ``x`` and ``y`` may be ``z`` itself. As for ``*=``, every reference to
+        ``z`` sees its new value, see :meth:`__imul__`.
+
+        Args:
+            x (Element): The left factor
+            y (Element): The right factor
+
+        Returns:
+            None
+
+        Raises:
+            TypeError:  If the arguments are not of the same type as this, or
+                        the elements do not wrap libsemigroups elements.
+            ValueError: If the arguments are not of the same degree as this.
+
+        Example:
+            >>> from semigroups import Transformation
+            >>> z = Transformation([0, 1, 2])
+            >>> z.product_into(Transformation([1, 0, 1]),
+            ...                Transformation([2, 1, 0]))
+            >>> z
+            Transformation([1, 2, 1])
+        '''
+        if self._handle == NULL or x._handle == NULL or y._handle == NULL:
+            raise TypeError('elements of type %s cannot be changed in place'
+                            % type(self).__name__)
+        _check_compatible(self, x)
+        _check_compatible(self, y)
+        self._redefine(x, y)
+
+    def __richcmp__(ElementABC self, object that, int op):
+        # Elements of different types are never equal, even if they have the
+        # same hash value, but they cannot be ordered.
+        if not isinstance(that, ElementABC):
+            return NotImplemented
+        elif not isinstance(self, type(that)):
+            if op == 2 or op == 3:
+                return NotImplemented
             raise TypeError('the arguments (elements) must be same type')
-        elif op == 0:
+        cdef ElementABC other = that
+        if op == 0:
             return self._handle[0] < other._handle[0]
         elif op == 1:
             return (self._handle[0] < other._handle[0] 
@@ -79,28 +395,46 @@ cdef class ElementABC:
                         or self._handle[0] == other._handle[0])
         elif op == 5:
             return not self._handle[0] < other._handle[0]
-    
-    # TODO avoid creating new elements for every product here
+
+    def __hash__(self):
+        # this is the hash value used by libsemigroups, which is computed once
+        # and cached until the element is next changed; it only depends on the
+        # data of the element, so elements of different types may have equal
+        # hash values, but they are never equal, see __richcmp__
+        cdef Py_hash_t out = <Py_hash_t> self._handle.hash_value()
+        return -2 if out == -1 else out
+
     def __pow__(self, n, modulo):
         message = 'the argument (power) must be a non-negative integer'
         if not isinstance(n, int):
             raise TypeError(message)
         elif n < 0:
             raise ValueError(message)
-
-        if n == 0:
-            return self.identity()
-        g = self
-        if n % 2 == 1:
-            x = self  # x = x * g
-        else:
-            x = self.identity()
-        while n > 1:
-            g *= g
-            n //= 2
+        cdef ElementABC x = self
+        if x._handle == NULL:
+            # as in __imul__
+            return _power_by_squaring(x, n)
+        return x.wrap_handle(x._power(n))
+
+    cdef libsemigroups.Element* _power(self, n) except NULL:
+        # Square and multiply, where every product overwrites one of two
+        # scratch elements, so that only three C++ elements are ever created.
+        cdef libsemigroups.Element* result = self._handle.identity()
+        cdef libsemigroups.Element* g = self._handle.really_copy()
+        cdef libsemigroups.Element* tmp = self._handle.identity()
+        while n > 0:
             if n % 2 == 1:
-                x *= g
-        return x
+                tmp.redefine(result, g)
+                result, tmp = tmp, result
+            n //= 2
+            if n > 0:
+                tmp.redefine(g, g)
+                g, tmp = tmp, g
+        g.really_delete()
+        del g
+        tmp.really_delete()
+        del tmp
+        return result
 
     def degree(self):
         '''
@@ -147,30 +481,846 @@ cdef class ElementABC:
             >>> PartialPerm([0, 2], [1, 2], 3).identity()
             PartialPerm([0, 1, 2], [0, 1, 2], 3)
         '''
-        cdef libsemigroups.Element* identity = self._handle.identity()
-        out = self.new_from_handle(identity)
-        identity[0].really_delete()
+        return self.wrap_handle(self._handle.identity())
+
+    cdef _elements_array(self, vector[libsemigroups.Element*]& elements):
+        # Return an array whose i-th entry is the data of elements[i], where
+        # every element has the type and degree of self.
+        raise TypeError('elements of this type cannot be exported as an '
+                        + 'array')
+
+    cdef vector[libsemigroups.Element*] _new_elements_from_array(
+            self, array) except *:
+        # The inverse of _elements_array: return new elements of the type of
+        # self whose data are the entries of <array>, after checking them.
+        raise TypeError('elements of this type cannot be created from an '
+                        + 'array')
+
+    def multiply_all(self, others):
+        '''
+        Function for multiplying an element on the right by many elements.
+
+        This is equivalent to ``[self * y for y in others]``, but the
+        arguments are checked once and the products are computed in a single
+        loop in C++, see :func:`multiply_many`.
+
+        Args:
+            others (list): Elements of the same type and degree as this one
+
+        Returns:
+            list: The products of this element with each of ``others``
+
+        Raises:
+            TypeError:  If any of ``others`` is not of the same type.
+            ValueError: If any of ``others`` is not of the same degree.
+
+        Example:
+            >>> from semigroups import Transformation
+            >>> Transformation([1, 0, 1]).multiply_all(
+            ...     [Transformation([0, 0, 2]), Transformation([2, 1, 0])])
+            [Transformation([0, 0, 0]), Transformation([1, 2, 1])]
+        '''
+        others = list(others)
+        return multiply_many([self] * len(others), others)
+
+    def to_bytes(self):
+        '''
+        Function for converting an element into a compact bytes object.
+
+        The bytes consist of an 8 byte header, recording the type and degree
+        of the element, followed by the raw data of the element, such as its
+        images. This is also how elements are pickled.
+
+        Args:
+            None
+
+        Returns:
+            bytes: The bytes representing the element
+
+        Raises:
+            TypeError:  If the element does not wrap a libsemigroups element.
+
+        Example:
+            >>> from semigroups import Transformation
+            >>> x = Transformation([1, 0, 1])
+            >>> Transformation.from_bytes(x.to_bytes()) == x
+            True
+        '''
+        if self._handle == NULL:
+            raise TypeError('elements of type %s cannot be converted to bytes'
+                            % type(self).__name__)
+        width, payload = self._to_data()
+        return _BYTES_HEADER.pack(self._bytes_tag, width,
+                                  self._handle.degree()) + payload
+
+    @classmethod
+    def from_bytes(cls, data):
+        '''
+        Function for constructing an element from the output of ``to_bytes``.
+
+        The data of the element is not checked, only the header and length of
+        ``data``.
+
+        Args:
+            data (bytes):   The output of ``to_bytes`` for an element of this
+                            type
+
+        Returns:
+            ElementABC: The element represented by ``data``
+
+        Raises:
+            ValueError: If ``data`` does not represent an element of this
+                        type, or has the wrong length.
+
+        Example:
+            >>> from semigroups import BooleanMat
+            >>> BooleanMat.from_bytes(BooleanMat([0, 1], [1, 1]).to_bytes())
+            BooleanMat([[0, 1], [1, 1]])
+        '''
+        if len(data) < _BYTES_HEADER.size:
+            raise ValueError('the argument (data) is too short')
+        tag, width, degree = _BYTES_HEADER.unpack_from(data)
+        if tag != cls._bytes_tag:
+            raise ValueError('the argument (data) does not represent an '
+                             + 'element of this type')
+        return cls._from_data(width, degree,
+                              memoryview(data)[_BYTES_HEADER.size:])
+
+    def __reduce__(self):
+        return (_element_from_bytes, (type(self), self.to_bytes()))
+
+def _power_by_squaring(x, n):
+    # Return x ** n using only x * y and x.identity(), for the elements which
+    # do not wrap a libsemigroups element.
+    result = x.identity()
+    while n > 0:
+        if n % 2 == 1:
+            result = result * x
+        n //= 2
+        if n > 0:
+            x = x * x
+    return result
+
+# The header of the bytes representing an element: a tag for the type of the
+# element, the number of bytes in each entry of the data which follows, and
+# the degree of the element.
+_BYTES_HEADER = struct.Struct('<2sBxI')
+
+def _element_from_bytes(cls, data):
+    # used to unpickle elements
+    return cls.from_bytes(data)
+
+def _from_payload(payload, dtype, size_t count, size_t offset=0):
+    # Return the <count> entries of type <dtype> starting at byte <offset> of
+    # <payload>, which must contain no more than these.
+    dtype = numpy.dtype(dtype)
+    if len(payload) != offset + count * dtype.itemsize:
+        raise ValueError('the argument (data) has the wrong length')
+    return numpy.frombuffer(payload, dtype, count, offset)
+
+def _images_to_data(ElementABC x):
+    images = x.as_array()
+    return (images.itemsize,
+            images.astype('<u%d' % images.itemsize).tobytes())
+
+cdef _images_rows(vector[libsemigroups.Element*]& elements, size_t degree,
+                  bint partial):
+    # Return the array whose rows are the images of <elements>, which are
+    # transformations (or partial perms if <partial>) of the given degree.
+    out = numpy.empty((elements.size(), degree), dtype=_image_dtype(degree))
+    cdef size_t i, nbytes = degree * _image_width(degree)
+    cdef uint8_t[:, ::1] view
+    if elements.size() > 0 and nbytes > 0:
+        view = out.view(numpy.uint8)
+        with nogil:
+            for i in range(elements.size()):
+                memcpy(&view[i, 0], _images(elements[i], partial), nbytes)
+    return out
+
+def _images_from_data(cls, width, degree, payload, bint partial):
+    if width != _image_width(degree):
+        raise ValueError('the argument (data) is corrupt')
+    images = _from_payload(payload, '<u%d' % width, degree)
+    images = images.astype(_image_dtype(degree)).reshape(1, degree)
+    return _new_from_images(cls, images, partial)[0]
+
+cdef _check_compatible(ElementABC x, ElementABC y):
+    if not isinstance(x, type(y)):
+        raise TypeError('Elements must be same type')
+    elif x._handle.degree() != y._handle.degree():
+        raise ValueError('Element degrees must be equal')
+
+cdef void _functional_graph(size_t* f, size_t n, vector[size_t]& depth,
+                            vector[size_t]& entry, vector[size_t]& cycles,
+                            vector[size_t]& cycle_start,
+                            vector[size_t]& cycle_pos) noexcept nogil:
+    # Decompose the functional graph of the transformation with images
+    # f[0], ..., f[n - 1] into its cycles and the trees hanging off them.
+    # Afterwards, for every point i:
+    #   depth[i] is the least k such that (i)f ^ k lies on a cycle, and
+    #   entry[i] is (i)f ^ depth[i];
+    # and if i lies on a cycle, then the points of that cycle, in order, are
+    # cycles[cycle_start[i]], cycles[cycle_start[i] + 1], ..., with i being
+    # cycles[cycle_start[i] + cycle_pos[i]]. Every point is visited twice.
+    cdef vector[size_t] path, on_path
+    cdef size_t i, j, k
+    depth.clear()
+    depth.resize(n, 0)
+    entry.clear()
+    entry.resize(n, n)  # n means that the point is not yet processed
+    cycle_start.clear()
+    cycle_start.resize(n, 0)
+    cycle_pos.clear()
+    cycle_pos.resize(n, 0)
+    on_path.resize(n, n)  # the index of a point in path, or n
+    for i in range(n):
+        if entry[i] != n:
+            continue
+        j = i
+        while entry[j] == n and on_path[j] == n:
+            on_path[j] = path.size()
+            path.push_back(j)
+            j = f[j]
+        if entry[j] == n:
+            # j belongs to path, and so path[on_path[j]:] is a new cycle
+            for k in range(on_path[j], path.size()):
+                cycle_start[path[k]] = cycles.size() - (k - on_path[j])
+                cycle_pos[path[k]] = k - on_path[j]
+                entry[path[k]] = path[k]
+                cycles.push_back(path[k])
+            path.resize(on_path[j])
+        # the remaining points of path lead to a point which is processed
+        while path.size() > 0:
+            k = path.back()
+            path.pop_back()
+            depth[k] = depth[f[k]] + 1
+            entry[k] = entry[f[k]]
+        j = i
+        while on_path[j] != n:
+            on_path[j] = n
+            j = f[j]
+
+cdef void _redefine_all(vector[libsemigroups.Element*]& products,
+                        vector[libsemigroups.Element*]& lefts,
+                        vector[libsemigroups.Element*]& rights) noexcept nogil:
+    cdef size_t i
+    for i in range(products.size()):
+        products[i].redefine(lefts[i], rights[i])
+
+cdef bint _products_release_gil(ElementABC x):
+    # Whether the GIL can be released while multiplying elements of the type
+    # of <x>. Wrapped Python objects are multiplied by calling into Python,
+    # and the products of bipartitions and PBRs use scratch space in
+    # libsemigroups, shared by all the products with the same thread id, so
+    # these are only multiplied while holding the GIL.
+    return not isinstance(x, (PythonElementNC, BipartitionNC, PBRNC))
+
+def multiply_many(lefts, rights, out=None):
+    '''
+    Function for multiplying many pairs of elements at once.
+
+    The arguments are checked once, and then all of the products are computed
+    in a single loop in C++, which runs without the GIL unless the elements
+    are wrapped Python objects, bipartitions or PBRs.
+
+    Args:
+        lefts (list):   The left factors, elements of one type and degree
+        rights (list):  The right factors, of the same type and degree as
+                        ``lefts`` and of the same length
+        out (list):     Optional elements of the same type and degree, whose
+                        values are overwritten by the products, instead of
+                        creating new elements
+
+    Returns:
+        list: The products ``lefts[i] * rights[i]``, i.e. ``out`` if it is
+        given.
+
+    Raises:
+        TypeError:  If the elements are not all of the same type.
+        ValueError: If the elements are not all of the same degree, if the
+                    arguments have different lengths, or if ``out`` shares
+                    an element with ``lefts`` or ``rights``.
+
+    Example:
+        >>> from semigroups import multiply_many, Transformation
+        >>> x, y = Transformation([1, 0, 1]), Transformation([2, 1, 0])
+        >>> multiply_many([x, y], [y, x])
+        [Transformation([1, 2, 1]), Transformation([1, 0, 1])]
+    '''
+    lefts, rights = list(lefts), list(rights)
+    if len(lefts) != len(rights):
+        raise ValueError('the arguments (lefts and rights) must have equal '
+                         + 'length')
+    elif out is not None:
+        out = list(out) if not isinstance(out, list) else out
+        if len(out) != len(lefts):
+            raise ValueError('the argument (out) must have the same length '
+                             + 'as the other arguments')
+        elif not set(map(id, out)).isdisjoint(map(id, lefts + rights)):
+            raise ValueError('the argument (out) must not contain any of the '
+                             + 'factors')
+    if len(lefts) == 0:
+        return [] if out is None else out
+
+    cdef ElementABC first = lefts[0]
+    cdef ElementABC x
+    cdef size_t degree = first._handle.degree()
+    cdef vector[libsemigroups.Element*] c_lefts, c_rights, c_products
+    for x in lefts + rights + ([] if out is None else out):
+        if not isinstance(x, type(first)):
+            raise TypeError('Elements must be same type')
+        elif <size_t> x._handle.degree() != degree:
+            raise ValueError('Element degrees must be equal')
+    for x in lefts:
+        c_lefts.push_back(x._handle)
+    for x in rights:
+        c_rights.push_back(x._handle)
+    if out is None:
+        for i in range(len(lefts)):
+            c_products.push_back(first._handle.identity())
+    else:
+        for x in out:
+            x._detach()
+            c_products.push_back(x._handle)
+
+    if _products_release_gil(first):
+        with nogil:
+            _redefine_all(c_products, c_lefts, c_rights)
+    else:
+        _redefine_all(c_products, c_lefts, c_rights)
+
+    if out is not None:
+        for x in out:
+            x._clear_caches()
         return out
+    return [first.wrap_handle(c_products[i]) for i in range(len(lefts))]
+
+def _images_array(images, bint partial, bint check):
+    # Return <images> as a C contiguous 2-dimensional array whose dtype is
+    # _image_dtype of the degree, in which the undefined images of partial
+    # perms are the largest value of the dtype, checking that every row is
+    # valid if <check> is True. This is vectorised so that it does not loop
+    # over the images in Python. Undefined images may be given as -1, as
+    # _UNDEFINED_IMAGE (unless this is a point) or as the largest value of
+    # the dtype, all of which become the largest value of the dtype when
+    # converted to it.
+    images = numpy.asarray(images)
+    if images.ndim != 2:
+        raise ValueError('the argument (array) must be 2-dimensional')
+    n = images.shape[1]
+    dtype = _image_dtype(n)
+    if check and images.size > 0:
+        if not numpy.issubdtype(images.dtype, numpy.integer):
+            raise TypeError('the argument (array) must contain integers')
+        elif partial:
+            defined = (images >= 0) & (images != numpy.iinfo(dtype).max)
+            if dtype != numpy.uint32:
+                defined &= images != _UNDEFINED_IMAGE
+            if (images[~defined] < -1).any() or (images[defined] >= n).any():
+                raise ValueError('the images must be -1 or in the range '
+                                 + '[0, %d)' % n)
+            rows = numpy.sort(numpy.where(defined, images, n), axis=1)
+            if ((rows[:, 1:] == rows[:, :-1]) & (rows[:, 1:] < n)).any():
+                raise ValueError('the defined images must not contain '
+                                 + 'duplicates')
+        elif images.min() < 0 or images.max() >= n:
+            raise ValueError('the images must be in the range [0, %d)' % n)
+    return numpy.ascontiguousarray(images.astype(dtype, copy=False))
+
+cdef vector[libsemigroups.Element*] _new_elements_from_rows(
+        const image_t[:, ::1] images, bint partial) except *:
+    cdef size_t i, n = images.shape[1]
+    cdef vector[image_t] row
+    cdef vector[libsemigroups.Element*] out
+    row.resize(n)
+    for i in range(images.shape[0]):
+        if n > 0:
+            memcpy(row.data(), &images[i, 0], n * sizeof(image_t))
+        if partial:
+            out.push_back(new libsemigroups.PartialPerm[image_t](row))
+        else:
+            out.push_back(new libsemigroups.Transformation[image_t](row))
+    return out
+
+cdef vector[libsemigroups.Element*] _new_elements(images,
+                                                  bint partial) except *:
+    # Return new transformations or partial perms whose images are the rows
+    # of <images>, which must be returned by _images_array, without any
+    # checks.
+    if images.dtype == numpy.uint8:
+        return _new_elements_from_rows[uint8_t](images, partial)
+    elif images.dtype == numpy.uint16:
+        return _new_elements_from_rows[uint16_t](images, partial)
+    return _new_elements_from_rows[uint32_t](images, partial)
+
+cdef libsemigroups.Element* _new_element_from_values(
+        vector[image_t]& row, values, bint partial) except NULL:
+    # Return a new transformation or partial perm whose images are the ints in
+    # the list or tuple <values>, converted as by _images_array, without any
+    # checks. The images are first stored in the empty vector <row>.
+    row.reserve(len(values))
+    for value in values:
+        # the cast wraps around, like astype, so that -1 and _UNDEFINED_IMAGE
+        # become the largest value of image_t
+        row.push_back(<image_t> <int64_t> value)
+    if partial:
+        return new libsemigroups.PartialPerm[image_t](row)
+    return new libsemigroups.Transformation[image_t](row)
+
+cdef libsemigroups.Element* _new_element(images, bint partial) except NULL:
+    # Return a new transformation or partial perm with the given images,
+    # without any checks. Lists and tuples, the most common case, are
+    # converted in a single loop; anything else, such as arrays, by
+    # _images_array.
+    cdef size_t width
+    cdef vector[uint8_t] row8
+    cdef vector[uint16_t] row16
+    cdef vector[uint32_t] row32
+    if isinstance(images, (list, tuple)):
+        width = _image_width(len(images))
+        if width == 1:
+            return _new_element_from_values[uint8_t](row8, images, partial)
+        elif width == 2:
+            return _new_element_from_values[uint16_t](row16, images, partial)
+        return _new_element_from_values[uint32_t](row32, images, partial)
+    return _new_elements(_images_array([images], partial, False), partial)[0]
+
+cdef void _delete_elements(
+        vector[libsemigroups.Element*]& elements) noexcept nogil:
+    cdef size_t i
+    for i in range(elements.size()):
+        elements[i].really_delete()
+        del elements[i]
+
+cdef list _new_from_images(type cls, images, bint partial):
+    # Return a list of elements of type <cls> with the rows of <images> as
+    # their images, without any checks, or running <cls>.__init__.
+    cdef ElementABC x
+    out = []
+    for handle in _new_elements(images, partial):
+        x = cls.__new__(cls)
+        x._handle = <libsemigroups.Element *> handle
+        out.append(x)
+    return out
 
 cdef class TransformationNC(ElementABC):
+    cdef Py_ssize_t _buffer_shape
+
+    _bytes_tag = b'ST'
+
+    def _to_data(self):
+        return _images_to_data(self)
+
+    @classmethod
+    def _from_data(cls, width, degree, payload):
+        return _images_from_data(cls, width, degree, payload, False)
+
+    cdef _elements_array(self, vector[libsemigroups.Element*]& elements):
+        return _images_rows(elements, self._handle.degree(), False)
+
+    cdef vector[libsemigroups.Element*] _new_elements_from_array(
+            self, array) except *:
+        return _new_elements(_images_array(array, False, True), False)
+
     def __init__(self, images):
-        self._handle = new libsemigroups.Transformation[uint16_t](images)
+        self._handle = _new_element(images, False)
 
     def __iter__(self):
-        cdef libsemigroups.Element* e = self._handle
-        e2 = <libsemigroups.Transformation[uint16_t] *>e
-        for x in e2[0]:
-            yield x
+        return iter(self.as_array().tolist())
+
+    def __getbuffer__(self, Py_buffer* buffer, int flags):
+        _get_images_buffer(self, False, buffer, flags, &self._buffer_shape)
+
+    def __releasebuffer__(self, Py_buffer* buffer):
+        self._nr_exports -= 1
+
+    cdef libsemigroups.Element* _power(self, n) except NULL:
+        # The index of a transformation is less than its degree, so if n is at
+        # least the degree, then (i)f ^ n only depends on the cycle containing
+        # (i)f ^ n and on n modulo the length of that cycle.
+        cdef size_t deg = self._handle.degree()
+        if n < deg:
+            return ElementABC._power(self, n)
+        cdef vector[size_t] f, depth, entry, cycles, cycle_start, cycle_pos
+        cdef vector[size_t] length, residue
+        cdef size_t i, j, x, c, shift
+        with nogil:
+            _get_images(self._handle, False, f)
+            _functional_graph(f.data(), deg, depth, entry, cycles,
+                              cycle_start, cycle_pos)
+        # length[s] is the length of the cycle starting at cycles[s] and
+        # residue[c] is n modulo c, for every cycle length c
+        length.resize(cycles.size(), 0)
+        residue.resize(deg + 1, 0)
+        i = 0
+        while i < cycles.size():
+            j = i
+            while j < cycles.size() and cycle_start[cycles[j]] == i:
+                j += 1
+            length[i] = j - i
+            residue[j - i] = n % (j - i)
+            i = j
+
+        cdef libsemigroups.Element* result = self._handle.identity()
+        with nogil:
+            for i in range(deg):
+                x = entry[i]
+                c = length[cycle_start[x]]
+                shift = (residue[c] + c - depth[i] % c) % c
+                f[i] = cycles[cycle_start[x] + (cycle_pos[x] + shift) % c]
+            _set_images(result, False, f)
+        return result
+
+    @classmethod
+    def from_array(cls, images, check=True):
+        '''
+        Function for constructing a transformation from an array of images.
+
+        The images are checked in a single vectorised pass, or not at all if
+        ``check`` is ``False``, and then passed straight to libsemigroups.
+
+        Args:
+            images (numpy.ndarray): The images of ``[0, 1, ..., n - 1]``;
+                                    anything that ``numpy.asarray`` accepts
+            check (bool):           Whether to check the images
+
+        Returns:
+            Transformation: The transformation with the given images
+
+        Raises:
+            TypeError:  If ``check`` is ``True`` and the images are not
+                        integers.
+            ValueError: If ``check`` is ``True`` and an image is not in the
+                        range [0, n).
+
+        Example:
+            >>> import numpy
+            >>> from semigroups import Transformation
+            >>> Transformation.from_array(numpy.array([1, 0, 1]))
+            Transformation([1, 0, 1])
+        '''
+        return cls.from_2d_array([images], check)[0]
+
+    @classmethod
+    def from_2d_array(cls, array, check=True):
+        '''
+        Function for constructing many transformations from a 2-d array.
+
+        Every row of ``array`` is the list of images of a transformation. The
+        whole array is checked in one vectorised pass, or not at all if
+        ``check`` is ``False``.
+
+        Args:
+            array (numpy.ndarray):  An array of shape ``(k, n)``
+            check (bool):           Whether to check the images
+
+        Returns:
+            list: The ``k`` transformations of degree ``n``
+
+        Raises:
+            TypeError:  If ``check`` is ``True`` and the images are not
+                        integers.
+            ValueError: If ``check`` is ``True`` and an image is not in the
+                        range [0, n), or if ``array`` is not 2-dimensional.
+
+        Example:
+            >>> from semigroups import Transformation
+            >>> Transformation.from_2d_array([[1, 0, 1], [2, 2, 2]])
+            [Transformation([1, 0, 1]), Transformation([2, 2, 2])]
+        '''
+        return _new_from_images(cls, _images_array(array, False, check),
+                                False)
+
+    def as_array(self):
+        '''
+        Function for viewing the images of a transformation as an array.
+
+        The returned array shares its memory with the transformation, it is
+        read-only, and it keeps the transformation alive for as long as it
+        exists, so no images are copied.
+
+        Args:
+            None
+
+        Returns:
+            numpy.ndarray: The images of the transformation, whose dtype is
+            uint8, uint16 or uint32, the narrowest which fits the degree
+
+        Raises:
+            TypeError:  If any argument is given.
+
+        Example:
+            >>> from semigroups import Transformation
+            >>> Transformation([1, 0, 1]).as_array()
+            array([1, 0, 1], dtype=uint8)
+        '''
+        return numpy.asarray(self)
 
 cdef class PartialPermNC(ElementABC):
+    cdef Py_ssize_t _buffer_shape
+
+    _bytes_tag = b'SP'
+
+    def _to_data(self):
+        return _images_to_data(self)
+
+    @classmethod
+    def _from_data(cls, width, degree, payload):
+        return _images_from_data(cls, width, degree, payload, True)
+
+    cdef _elements_array(self, vector[libsemigroups.Element*]& elements):
+        return _images_rows(elements, self._handle.degree(), True)
+
+    cdef vector[libsemigroups.Element*] _new_elements_from_array(
+            self, array) except *:
+        return _new_elements(_images_array(array, True, True), True)
+
     def __init__(self, images):
-        self._handle = new libsemigroups.PartialPerm[uint16_t](images)
+        # undefined images are -1
+        self._handle = _new_element(images, True)
 
     def __iter__(self):
-        cdef libsemigroups.Element* e = self._handle
-        e2 = <libsemigroups.PartialPerm[uint16_t] *>e
-        for x in e2[0]:
-            yield x
+        # the undefined images are _UNDEFINED_IMAGE, whereas as_array uses
+        # the largest value of its dtype
+        images = self.as_array()
+        if images.dtype == numpy.uint8:
+            images = numpy.where(images == 0xFF, _UNDEFINED_IMAGE, images)
+        return iter(images.tolist())
+
+    def __getbuffer__(self, Py_buffer* buffer, int flags):
+        _get_images_buffer(self, True, buffer, flags, &self._buffer_shape)
+
+    def __releasebuffer__(self, Py_buffer* buffer):
+        self._nr_exports -= 1
+
+    @classmethod
+    def from_images(cls, images, check=True):
+        '''
+        Function for constructing a partial perm from an array of images.
+
+        The images are checked in a single vectorised pass, or not at all if
+        ``check`` is ``False``, and then passed straight to libsemigroups.
+
+        Args:
+            images (numpy.ndarray): The images of ``[0, 1, ..., n - 1]``,
+                                    where -1 (or the undefined value used
+                                    by :meth:`as_array`) means undefined;
+                                    anything that ``numpy.asarray`` accepts
+            check (bool):           Whether to check the images
+
+        Returns:
+            PartialPerm: The partial perm with the given images
+
+        Raises:
+            TypeError:  If ``check`` is ``True`` and the images are not
+                        integers.
+            ValueError: If ``check`` is ``True`` and an image is neither -1
+                        nor in the range [0, n), or if two points have the
+                        same image.
+
+        Example:
+            >>> import numpy
+            >>> from semigroups import PartialPerm
+            >>> PartialPerm.from_images(numpy.array([2, -1, 0]))
+            PartialPerm([0, 2], [2, 0], 3)
+        '''
+        return cls.from_2d_array([images], check)[0]
+
+    @classmethod
+    def from_2d_array(cls, array, check=True):
+        '''
+        Function for constructing many partial perms from a 2-d array.
+
+        Every row of ``array`` is the list of images of a partial perm, as in
+        :meth:`from_images`. The whole array is checked in one vectorised
+        pass, or not at all if ``check`` is ``False``.
+
+        Args:
+            array (numpy.ndarray):  An array of shape ``(k, n)``
+            check (bool):           Whether to check the images
+
+        Returns:
+            list: The ``k`` partial perms of degree ``n``
+
+        Raises:
+            TypeError:  If ``check`` is ``True`` and the images are not
+                        integers.
+            ValueError: If ``check`` is ``True`` and some row is not the list
+                        of images of a partial perm, or if ``array`` is not
+                        2-dimensional.
+
+        Example:
+            >>> from semigroups import PartialPerm
+            >>> PartialPerm.from_2d_array([[1, -1], [-1, -1]])
+            [PartialPerm([0], [1], 2), PartialPerm([], [], 2)]
+        '''
+        return _new_from_images(cls, _images_array(array, True, check), True)
+
+    def as_array(self):
+        '''
+        Function for viewing the images of a partial permutation as an array.
+
+        The returned array shares its memory with the partial permutation, it
+        is read-only, and it keeps the partial permutation alive for as long
+        as it exists. Points not in the domain have the largest value of the
+        dtype as their image.
+
+        Args:
+            None
+
+        Returns:
+            numpy.ndarray: The images of the partial permutation, whose dtype
+            is uint8, uint16 or uint32, the narrowest which fits the degree
+
+        Raises:
+            TypeError:  If any argument is given.
+
+        Example:
+            >>> from semigroups import PartialPerm
+            >>> PartialPerm([0, 2], [1, 0], 3).as_array()
+            array([  1, 255,   0], dtype=uint8)
+        '''
+        return numpy.asarray(self)
+
+    def domain_array(self):
+        '''
+        Function for finding the domain of a partial permutation as an array.
+
+        Args:
+            None
+
+        Returns:
+            numpy.ndarray: The points in the domain, in increasing order,
+            with the same dtype as :meth:`as_array`
+
+        Example:
+            >>> from semigroups import PartialPerm
+            >>> PartialPerm([1, 2, 5], [2, 3, 5], 6).domain_array()
+            array([1, 2, 5], dtype=uint8)
+        '''
+        images = self.as_array()
+        return numpy.flatnonzero(
+            images != numpy.iinfo(images.dtype).max).astype(images.dtype)
+
+    def range_array(self):
+        '''
+        Function for finding the range of a partial permutation as an array.
+
+        Args:
+            None
+
+        Returns:
+            numpy.ndarray: The images of the points in the domain, in the
+            order of :meth:`domain_array`
+
+        Example:
+            >>> from semigroups import PartialPerm
+            >>> PartialPerm([1, 2, 5], [3, 2, 5], 6).range_array()
+            array([3, 2, 5], dtype=uint8)
+        '''
+        images = self.as_array()
+        return images[images != numpy.iinfo(images.dtype).max]
+
+    def inverse(self):
+        '''
+        Function for finding the inverse of a partial permutation.
+
+        Args:
+            None
+
+        Returns:
+            PartialPerm: The partial permutation mapping ``(i)f`` to ``i``
+            for every ``i`` in the domain of this partial permutation ``f``
+
+        Example:
+            >>> from semigroups import PartialPerm
+            >>> PartialPerm([1, 2, 5], [3, 2, 0], 6).inverse()
+            PartialPerm([0, 2, 3], [5, 2, 1], 6)
+        '''
+        cdef libsemigroups.Element* result = self._handle.identity()
+        cdef void* images = _images(self._handle, True)
+        cdef void* out = _images(result, True)
+        cdef size_t n = result.degree(), width = _image_width(n)
+        with nogil:
+            if width == 1:
+                _invert_images(<uint8_t *>images, <uint8_t *>out, n)
+            elif width == 2:
+                _invert_images(<uint16_t *>images, <uint16_t *>out, n)
+            else:
+                _invert_images(<uint32_t *>images, <uint32_t *>out, n)
+        return self.wrap_handle(result)
+
+    def restrict(self, points):
+        '''
+        Function for restricting a partial permutation to a set of points.
+
+        Args:
+            points (iterable):  Points in ``[0, n)``, where ``n`` is the
+                                degree
+
+        Returns:
+            PartialPerm: The partial permutation which agrees with this one
+            on ``points`` and is undefined elsewhere
+
+        Raises:
+            ValueError: If any of the points is not in the range [0, n).
+
+        Example:
+            >>> from semigroups import PartialPerm
+            >>> PartialPerm([1, 2, 5], [3, 2, 0], 6).restrict({0, 2, 5})
+            PartialPerm([2, 5], [2, 0], 6)
+        '''
+        images = self.as_array()
+        points = numpy.fromiter(points, dtype=numpy.intp)
+        n = images.shape[0]
+        if points.shape[0] > 0 and (points.min() < 0 or points.max() >= n):
+            raise ValueError('the argument (points) must consist of integers '
+                             + 'in the range [0, %d)' % n)
+        keep = numpy.zeros(n, dtype=numpy.bool_)
+        keep[points] = True
+        images = numpy.where(keep, images, numpy.iinfo(images.dtype).max)
+        return _new_from_images(type(self), images.reshape(1, n), True)[0]
+
+    def natural_leq(self, other):
+        '''
+        Function for comparing partial permutations in the natural partial
+        order.
+
+        A partial permutation ``f`` is less than or equal to ``g`` in the
+        natural partial order if ``f`` is a restriction of ``g``.
+
+        Args:
+            other (PartialPerm):    A partial permutation of the same degree
+
+        Returns:
+            bool: Whether this partial permutation is a restriction of
+            ``other``
+
+        Raises:
+            TypeError:  If ``other`` is not a partial permutation.
+            ValueError: If ``other`` has a different degree.
+
+        Example:
+            >>> from semigroups import PartialPerm
+            >>> x = PartialPerm([1, 2, 5], [3, 2, 0], 6)
+            >>> x.restrict([1, 5]).natural_leq(x)
+            True
+            >>> x.natural_leq(x.restrict([1, 5]))
+            False
+        '''
+        _check_compatible(self, other)
+        cdef void* f = _images(self._handle, True)
+        cdef void* g = _images((<ElementABC> other)._handle, True)
+        cdef size_t n = self._handle.degree(), width = _image_width(n)
+        cdef bint out
+        with nogil:
+            if width == 1:
+                out = _is_restriction(<uint8_t *>f, <uint8_t *>g, n)
+            elif width == 2:
+                out = _is_restriction(<uint16_t *>f, <uint16_t *>g, n)
+            else:
+                out = _is_restriction(<uint32_t *>f, <uint32_t *>g, n)
+        return out
 
     def rank(self):
         '''
@@ -191,12 +1341,239 @@ cdef class PartialPermNC(ElementABC):
             3
         '''
         cdef libsemigroups.Element* e = self._handle
-        e2 = <libsemigroups.PartialPerm[uint16_t] *>e
-        return e2.crank()
+        cdef size_t width = _image_width(e.degree())
+        if width == 1:
+            return (<libsemigroups.PartialPerm[uint8_t] *>e).crank()
+        elif width == 2:
+            return (<libsemigroups.PartialPerm[uint16_t] *>e).crank()
+        return (<libsemigroups.PartialPerm[uint32_t] *>e).crank()
+
+cdef uint32_t _relabel_in_order(uint32_t[::1] labels,
+                                size_t nr_labels) noexcept nogil:
+    # Relabel <labels>, whose values are in [0, nr_labels), in place so that
+    # the labels are 0, 1, 2, ... in the order of their first occurrence, and
+    # return the number of distinct labels.
+    cdef vector[uint32_t] relabel
+    cdef uint32_t next_label = 0
+    cdef size_t i
+    relabel.resize(nr_labels, <uint32_t> -1)
+    for i in range(<size_t> labels.shape[0]):
+        if relabel[labels[i]] == <uint32_t> -1:
+            relabel[labels[i]] = next_label
+            next_label += 1
+        labels[i] = relabel[labels[i]]
+    return next_label
+
+cdef bint _is_normalised(const uint32_t[::1] labels) noexcept nogil:
+    # Check that the labels in <labels> are 0, 1, 2, ... in the order of their
+    # first occurrence.
+    cdef uint32_t next_label = 0
+    cdef size_t i
+    for i in range(<size_t> labels.shape[0]):
+        if labels[i] > next_label:
+            return False
+        elif labels[i] == next_label:
+            next_label += 1
+    return True
+
+def normalise_labels(labels):
+    '''
+    Function for relabelling a sequence so that its labels are 0, 1, 2, ...
+    in the order in which they first occur.
+
+    Two sequences have the same normalised labels if and only if they induce
+    the same partition of their positions. In particular, the normalised
+    labels of the blocks of a bipartition are its blocks lookup.
+
+    Args:
+        labels (array_like):    A 1-dimensional sequence of hashable labels
+
+    Returns:
+        numpy.ndarray: The normalised labels, with dtype uint32
+
+    Example:
+        >>> from semigroups import normalise_labels
+        >>> normalise_labels([7, 7, -2, 'a', -2]).tolist()
+        [0, 0, 1, 2, 1]
+    '''
+    array = numpy.asarray(labels)
+    if array.ndim != 1:
+        raise ValueError('the argument (labels) must be 1-dimensional')
+    cdef size_t n = array.shape[0]
+    cdef size_t nr_labels
+    cdef uint32_t[::1] view
+    if n == 0:
+        return numpy.empty(0, dtype=numpy.uint32)
+    if (numpy.issubdtype(array.dtype, numpy.integer)
+            and array.min() >= 0 and array.max() < n):
+        nr_labels = n
+    elif array.dtype.kind not in 'biuf':
+        # labels which are not numbers may not be comparable (or may have been
+        # converted to strings by numpy), so they are numbered by a dict
+        index = {}
+        return numpy.array([index.setdefault(x, len(index)) for x in labels],
+                           dtype=numpy.uint32)
+    else:
+        distinct, array = numpy.unique(array, return_inverse=True)
+        nr_labels = distinct.shape[0]
+    out = numpy.array(array, dtype=numpy.uint32, order='C')
+    view = out
+    with nogil:
+        _relabel_in_order(view, nr_labels)
+    return out
+
+cdef libsemigroups.Element* _new_bipartition(
+        const uint32_t[::1] lookup) except NULL:
+    cdef vector[uint32_t] blocks_lookup
+    blocks_lookup.resize(lookup.shape[0])
+    if lookup.shape[0] > 0:
+        memcpy(blocks_lookup.data(), &lookup[0],
+               lookup.shape[0] * sizeof(uint32_t))
+    return new libsemigroups.Bipartition(blocks_lookup)
 
 cdef class BipartitionNC(ElementABC):
     def __init__(self, blocks_lookup):
-        self._handle = new libsemigroups.Bipartition(blocks_lookup)
+        self._handle = _new_bipartition(
+            numpy.ascontiguousarray(blocks_lookup, dtype=numpy.uint32))
+
+    _bytes_tag = b'SB'
+
+    def _to_data(self):
+        cdef libsemigroups.Bipartition* x
+        x = <libsemigroups.Bipartition *> self._handle
+        cdef size_t n = 2 * x.degree()
+        cdef uint32_t[::1] view
+        lookup = numpy.empty(n, dtype=numpy.uint32)
+        if n > 0:
+            view = lookup
+            memcpy(&view[0], &deref(x.begin()), n * sizeof(uint32_t))
+        width = _image_width(n)
+        return width, lookup.astype('<u%d' % width).tobytes()
+
+    @classmethod
+    def _from_data(cls, width, degree, payload):
+        if width != _image_width(2 * degree):
+            raise ValueError('the argument (data) is corrupt')
+        lookup = _from_payload(payload, '<u%d' % width, 2 * degree)
+        cdef ElementABC result = cls.__new__(cls)
+        result._handle = _new_bipartition(lookup.astype(numpy.uint32))
+        return result
+
+    cdef _elements_array(self, vector[libsemigroups.Element*]& elements):
+        cdef size_t i, n = 2 * self._handle.degree()
+        cdef uint32_t[:, ::1] view
+        out = numpy.empty((elements.size(), n), dtype=numpy.uint32)
+        if elements.size() > 0 and n > 0:
+            view = out
+            with nogil:
+                for i in range(elements.size()):
+                    memcpy(&view[i, 0],
+                           &deref((<libsemigroups.Bipartition *>
+                                   elements[i]).begin()),
+                           n * sizeof(uint32_t))
+        return out
+
+    cdef vector[libsemigroups.Element*] _new_elements_from_array(
+            self, array) except *:
+        array = numpy.asarray(array)
+        if array.ndim != 2 or array.shape[1] % 2 != 0:
+            raise ValueError('the argument (array) must be 2-dimensional, '
+                             + 'with an even number of columns')
+        elif array.size > 0 and (array.min() < 0
+                                 or array.max() >= array.shape[1]):
+            raise ValueError('the rows of the argument (array) must be '
+                             + 'normalised blocks lookups')
+        cdef uint32_t[:, ::1] view = numpy.ascontiguousarray(
+            array, dtype=numpy.uint32)
+        cdef vector[libsemigroups.Element*] out
+        cdef vector[uint32_t] lookup
+        cdef size_t i
+        for i in range(<size_t> view.shape[0]):
+            if not _is_normalised(view[i]):
+                _delete_elements(out)
+                raise ValueError('the rows of the argument (array) must be '
+                                 + 'normalised blocks lookups')
+            lookup.assign(&view[i, 0], &view[i, 0] + view.shape[1])
+            out.push_back(new libsemigroups.Bipartition(lookup))
+        return out
+
+    @classmethod
+    def from_lookup(cls, blocks_lookup, check=True):
+        '''
+        Function for constructing a bipartition from its blocks lookup.
+
+        The blocks lookup of a bipartition of degree ``n`` has length ``2n``;
+        its entry ``i - 1`` is the index of the block containing ``i``, and
+        its entry ``n + i - 1`` is the index of the block containing ``-i``.
+        The blocks must be indexed 0, 1, 2, ... in the order in which they
+        first occur.
+
+        Args:
+            blocks_lookup (array_like): The blocks lookup
+            check (bool):               Whether to check ``blocks_lookup``
+
+        Returns:
+            Bipartition: The bipartition with blocks lookup ``blocks_lookup``
+
+        Raises:
+            TypeError:  If ``check`` is ``True`` and the entries of
+                        ``blocks_lookup`` are not integers.
+            ValueError: If ``check`` is ``True`` and ``blocks_lookup`` is not
+                        a normalised blocks lookup of non-zero even length.
+
+        Example:
+            >>> from semigroups import Bipartition
+            >>> Bipartition.from_lookup([0, 0, 1, 0, 1, 2])
+            Bipartition([[1, 2, -1], [3, -2], [-3]])
+        '''
+        array = numpy.asarray(blocks_lookup)
+        if check:
+            if (array.ndim != 1 or array.shape[0] == 0
+                    or array.shape[0] % 2 != 0):
+                raise ValueError('the argument (blocks_lookup) must be a '
+                                 + '1-dimensional sequence of non-zero even '
+                                 + 'length')
+            elif not numpy.issubdtype(array.dtype, numpy.integer):
+                raise TypeError('the items in the argument (blocks_lookup) '
+                                + 'must be integers')
+            elif array.min() < 0 or array.max() >= array.shape[0]:
+                raise ValueError('the argument (blocks_lookup) is not '
+                                 + 'normalised')
+        array = numpy.ascontiguousarray(array, dtype=numpy.uint32)
+        if check and not _is_normalised(array):
+            raise ValueError('the argument (blocks_lookup) is not normalised')
+        cdef ElementABC result = cls.__new__(cls)
+        result._handle = _new_bipartition(array)
+        return result
+
+    @classmethod
+    def from_labels(cls, labels):
+        '''
+        Function for constructing a bipartition from arbitrary block labels.
+
+        Args:
+            labels (array_like):    A sequence of length ``2n`` whose entry
+                                    ``i - 1`` labels the block containing
+                                    ``i``, and whose entry ``n + i - 1``
+                                    labels the block containing ``-i``
+
+        Returns:
+            Bipartition: The bipartition in which two points are in the same
+            block if and only if they have equal labels
+
+        Raises:
+            ValueError: If ``labels`` does not have non-zero even length.
+
+        Example:
+            >>> from semigroups import Bipartition
+            >>> Bipartition.from_labels([5, 5, 3, 5, 3, 9])
+            Bipartition([[1, 2, -1], [3, -2], [-3]])
+        '''
+        lookup = normalise_labels(labels)
+        if lookup.shape[0] == 0 or lookup.shape[0] % 2 != 0:
+            raise ValueError('the argument (labels) must have non-zero even '
+                             + 'length')
+        return cls.from_lookup(lookup, check=False)
 
     def __iter__(self):
         cdef libsemigroups.Element* e = self._handle
@@ -262,20 +1639,248 @@ cdef class BipartitionNC(ElementABC):
         e2 = <libsemigroups.Bipartition *>e
         return e2.is_transverse_block(index)
 
+def _pack_boolean_mat(array, bint packed):
+    # Return the rows of the n x n boolean matrix <array> (n <= 64) as the
+    # words of a PackedBooleanMat. If <packed> is True, then <array> is an
+    # n x ceil(n / 8) array of uint8 in the layout of numpy.packbits.
+    n = array.shape[0]
+    padded = numpy.zeros((n, 8), dtype=numpy.uint8)
+    if packed:
+        padded[:, :(n + 7) // 8] = array
+    else:
+        padded[:, :(n + 7) // 8] = numpy.packbits(array, axis=1)
+    words = padded.view('>u8').ravel().astype(numpy.uint64)
+    # clear any bits beyond the last column
+    return words & numpy.uint64(((1 << n) - 1) << (64 - n))
+
+cdef libsemigroups.Element* _new_packed_boolean_mat(
+        const uint64_t[::1] words) except NULL:
+    cdef vector[uint64_t] rows
+    rows.resize(words.shape[0])
+    if words.shape[0] > 0:
+        memcpy(rows.data(), &words[0], words.shape[0] * sizeof(uint64_t))
+    return new libsemigroups.PackedBooleanMat(rows)
+
 cdef class BooleanMatNC(ElementABC):
+    """
+    Boolean matrices of dimension at most 64 are stored with each row packed
+    into a single 64-bit word, and multiplied a word at a time. Larger
+    boolean matrices are stored as libsemigroups BooleanMats.
+    """
     def __init__(self, rows):
-        self._handle = new libsemigroups.BooleanMat(rows)
+        if len(rows) <= 64:
+            self._handle = _new_packed_boolean_mat(
+                _pack_boolean_mat(numpy.asarray(rows, dtype=numpy.bool_), False))
+        else:
+            self._handle = new libsemigroups.BooleanMat(rows)
+
+    _bytes_tag = b'SM'
+
+    def _to_data(self):
+        return 1, self.to_numpy(packed=True).tobytes()
+
+    @classmethod
+    def _from_data(cls, width, degree, payload):
+        rows = _from_payload(payload, numpy.uint8, degree * ((degree + 7) // 8))
+        return cls.from_numpy(rows.reshape(degree, (degree + 7) // 8),
+                              packed=True, check=False)
+
+    cdef _elements_array(self, vector[libsemigroups.Element*]& elements):
+        cdef size_t i, n = self._handle.degree()
+        cdef uint64_t[:, ::1] view
+        if n > 64:
+            return numpy.array([self.new_view(elements[i], None).to_numpy(True)
+                                for i in range(elements.size())],
+                               dtype=numpy.uint8).reshape(
+                                   elements.size(), n, (n + 7) // 8)
+        words = numpy.empty((elements.size(), n), dtype=numpy.uint64)
+        if elements.size() > 0:
+            view = words
+            with nogil:
+                for i in range(elements.size()):
+                    memcpy(&view[i, 0],
+                           (<libsemigroups.PackedBooleanMat *>
+                            elements[i]).data(),
+                           n * sizeof(uint64_t))
+        out = words.astype('>u8').view(numpy.uint8)
+        out = out.reshape(elements.size(), n, 8)[:, :, :(n + 7) // 8]
+        return numpy.ascontiguousarray(out)
+
+    cdef vector[libsemigroups.Element*] _new_elements_from_array(
+            self, array) except *:
+        array = numpy.asarray(array)
+        if (array.ndim != 3 or array.dtype != numpy.uint8
+                or array.shape[2] != (array.shape[1] + 7) // 8):
+            raise ValueError('the argument (array) must have shape (k, n, '
+                             + 'ceil(n / 8)) and dtype uint8')
+        cdef size_t i, k = array.shape[0], n = array.shape[1]
+        cdef vector[libsemigroups.Element*] out
+        if n > 64:
+            for i in range(k):
+                x = self.from_numpy(array[i], packed=True, check=False)
+                out.push_back((<ElementABC> x)._handle.really_copy())
+            return out
+        padded = numpy.zeros((k, n, 8), dtype=numpy.uint8)
+        padded[:, :, :(n + 7) // 8] = array
+        words = padded.view('>u8').reshape(k, n).astype(numpy.uint64)
+        words &= numpy.uint64(((1 << n) - 1) << (64 - n))
+        cdef uint64_t[:, ::1] view = words
+        cdef vector[uint64_t] rows
+        for i in range(k):
+            rows.assign(&view[i, 0], &view[i, 0] + n)
+            out.push_back(new libsemigroups.PackedBooleanMat(rows))
+        return out
+
+    def __iter__(self): # iterate through values in the matrix
+        if self._handle.degree() <= 64:
+            return iter(self.to_numpy().ravel().tolist())
+        cdef libsemigroups.Element* e = self._handle
+        e2 = <libsemigroups.BooleanMat *>e
+        return iter([x for x in e2[0]])
+
+    @classmethod
+    def from_numpy(cls, array, packed=False, check=True):
+        '''
+        Function for constructing a boolean matrix from a NumPy array.
+
+        Args:
+            array (numpy.ndarray):  An ``n x n`` array of bools or of 0s and
+                                    1s, or if ``packed`` is ``True``, an
+                                    ``n x ceil(n / 8)`` array of uint8 in the
+                                    layout of ``numpy.packbits(x, axis=1)``
+            packed (bool):          Whether ``array`` is packed
+            check (bool):           Whether to check ``array``
+
+        Returns:
+            BooleanMat: The boolean matrix with the rows of ``array``
+
+        Raises:
+            TypeError:  If ``check`` is ``True`` and the entries of ``array``
+                        are not bools or 0s and 1s (or uint8 if ``packed``).
+            ValueError: If ``check`` is ``True`` and ``array`` has the wrong
+                        shape.
+
+        Example:
+            >>> import numpy
+            >>> from semigroups import BooleanMat
+            >>> BooleanMat.from_numpy(numpy.array([[1, 0], [1, 1]]))
+            BooleanMat([[1, 0], [1, 1]])
+            >>> BooleanMat.from_numpy(numpy.array([[128], [192]],
+            ...                                   dtype=numpy.uint8), True)
+            BooleanMat([[1, 0], [1, 1]])
+        '''
+        array = numpy.asarray(array)
+        if check:
+            if array.ndim != 2 or array.shape[0] == 0:
+                raise ValueError('the argument (array) must be a non-empty, '
+                                 + '2-dimensional array')
+            n = array.shape[0]
+            if packed:
+                if array.dtype != numpy.uint8:
+                    raise TypeError('the argument (array) must have dtype '
+                                    + 'uint8')
+                elif array.shape[1] != (n + 7) // 8:
+                    raise ValueError('the argument (array) must have shape '
+                                     + '(%d, %d)' % (n, (n + 7) // 8))
+            elif array.shape[1] != n:
+                raise ValueError('the argument (array) must be square')
+            elif array.dtype != numpy.bool_ and not (
+                    numpy.issubdtype(array.dtype, numpy.integer)
+                    and ((array == 0) | (array == 1)).all()):
+                raise TypeError('the items in the argument must all be bools '
+                                + 'or all be 0 or 1')
+        n = array.shape[0]
+        cdef ElementABC result = cls.__new__(cls)
+        if n <= 64:
+            result._handle = _new_packed_boolean_mat(
+                _pack_boolean_mat(array, packed))
+        else:
+            if packed:
+                array = numpy.unpackbits(array, axis=1, count=n)
+            rows = array.astype(numpy.bool_).tolist()
+            result._handle = new libsemigroups.BooleanMat(rows)
+        return result
+
+    def to_numpy(self, packed=False):
+        '''
+        Function for converting a boolean matrix into a NumPy array.
+
+        Args:
+            packed (bool):  Whether to return the rows packed into bytes, as
+                            by ``numpy.packbits(x, axis=1)``
 
-    def __iter__(self): # iterate through values in the matrix
+        Returns:
+            numpy.ndarray: An ``n x n`` array of bools, or if ``packed`` is
+            ``True``, an ``n x ceil(n / 8)`` array of uint8.
+
+        Example:
+            >>> from semigroups import BooleanMat
+            >>> BooleanMat([1, 0], [1, 1]).to_numpy()
+            array([[ True, False],
+                   [ True,  True]])
+            >>> BooleanMat([1, 0], [1, 1]).to_numpy(packed=True)
+            array([[128],
+                   [192]], dtype=uint8)
+        '''
+        cdef size_t n = self._handle.degree()
+        cdef uint64_t[::1] view
         cdef libsemigroups.Element* e = self._handle
-        e2 = <libsemigroups.BooleanMat *>e
-        for x in e2[0]:
-            yield x
+        if n > 64:
+            e2 = <libsemigroups.BooleanMat *>e
+            array = numpy.array([x for x in e2[0]],
+                                dtype=numpy.bool_).reshape(n, n)
+            return numpy.packbits(array, axis=1) if packed else array
+        words = numpy.empty(n, dtype=numpy.uint64)
+        view = words
+        memcpy(&view[0], (<libsemigroups.PackedBooleanMat *>e).data(),
+               n * sizeof(uint64_t))
+        rows = words.astype('>u8').view(numpy.uint8).reshape(n, 8)
+        rows = numpy.ascontiguousarray(rows[:, :(n + 7) // 8])
+        if packed:
+            return rows
+        return numpy.unpackbits(rows, axis=1, count=n).astype(numpy.bool_)
 
 cdef class PBRNC(ElementABC):
     def __init__(self, adj):
         self._handle = new libsemigroups.PBR(adj)
 
+    _bytes_tag = b'SR'
+
+    def _to_data(self):
+        # the data is the offsets of the out-neighbours of each point in the
+        # list of all out-neighbours, followed by that list
+        cdef libsemigroups.PBR* x = <libsemigroups.PBR *> self._handle
+        cdef vector[uint32_t] data
+        cdef vector[uint32_t] targets
+        cdef vector[vector[uint32_t]].iterator it = x.begin()
+        data.push_back(0)
+        while it != x.end():
+            targets.insert(targets.end(), deref(it).begin(), deref(it).end())
+            data.push_back(targets.size())
+            inc(it)
+        data.insert(data.end(), targets.begin(), targets.end())
+        cdef uint32_t[::1] view
+        out = numpy.empty(data.size(), dtype=numpy.uint32)
+        view = out
+        memcpy(&view[0], data.data(), data.size() * sizeof(uint32_t))
+        return 4, out.astype('<u4').tobytes()
+
+    @classmethod
+    def _from_data(cls, width, degree, payload):
+        if width != 4 or len(payload) < 4 * (2 * degree + 1):
+            raise ValueError('the argument (data) is corrupt')
+        offsets = numpy.frombuffer(payload, '<u4', 2 * degree + 1)
+        targets = _from_payload(payload, '<u4', offsets[-1],
+                                4 * (2 * degree + 1)).tolist()
+        offsets = offsets.tolist()
+        cdef vector[vector[uint32_t]] adj
+        cdef size_t i
+        for i in range(2 * degree):
+            adj.push_back(targets[offsets[i]:offsets[i + 1]])
+        cdef ElementABC result = cls.__new__(cls)
+        result._handle = new libsemigroups.PBR(adj)
+        return result
+
     def __iter__(self):
         cdef libsemigroups.Element* e = self._handle
         e2 = <libsemigroups.PBR *>e
@@ -339,6 +1944,116 @@ cdef class PythonElementNC(ElementABC):
     def __repr__(self):
         return repr(self.get_value())
 
+    def __reduce__(self):
+        return (type(self), (self.get_value(),))
+
+
+# The maximum number of threads used by each new semigroup, or None for the
+# default of libsemigroups, see set_default_max_threads.
+_default_max_threads = None
+
+def _check_nr_threads(nr_threads):
+    if not isinstance(nr_threads, int):
+        raise TypeError('the argument (nr_threads) must be an int')
+    elif nr_threads < 1:
+        raise ValueError('the argument (nr_threads) must be positive')
+
+def set_default_max_threads(nr_threads):
+    '''
+    Function for setting the maximum number of threads used by the
+    multi-threaded methods of every semigroup created afterwards.
+
+    Args:
+        nr_threads (int):   The number of threads, or ``None`` to restore the
+                            default of libsemigroups, which is the number of
+                            hardware threads
+
+    Raises:
+        TypeError:  If ``nr_threads`` is not an int or ``None``.
+        ValueError: If ``nr_threads`` is not positive.
+
+    Example:
+        >>> from semigroups import set_default_max_threads, default_max_threads
+        >>> set_default_max_threads(64)
+        >>> default_max_threads()
+        64
+        >>> set_default_max_threads(None)
+    '''
+    global _default_max_threads
+    if nr_threads is not None:
+        _check_nr_threads(nr_threads)
+    _default_max_threads = nr_threads
+
+def default_max_threads():
+    '''
+    Function for finding the value set by :func:`set_default_max_threads`.
+
+    Returns:
+        int: The maximum number of threads used by new semigroups, or ``None``
+        if this is the default of libsemigroups
+    '''
+    return _default_max_threads
+
+cdef void _scc_labels(const uint64_t[:, ::1] graph,
+                      uint64_t[::1] out) noexcept nogil:
+    # Set out[v] to the label of the strongly connected component of the
+    # vertex v of <graph>, whose row v lists the targets of the edges from v.
+    # The labels are 0, 1, 2, ... in the order of the first occurrence of
+    # their components. This is an iterative version of Tarjan's algorithm,
+    # so that long paths do not exhaust the stack.
+    cdef size_t n = graph.shape[0], m = graph.shape[1]
+    cdef size_t undefined = <size_t> -1
+    cdef size_t root, v, w, e, counter = 0, nr_components = 0
+    cdef vector[size_t] index, lowlink, stack, frames, edges, relabel
+    cdef vector[uint8_t] on_stack
+    index.resize(n, undefined)
+    lowlink.resize(n, 0)
+    on_stack.resize(n, 0)
+    for root in range(n):
+        if index[root] != undefined:
+            continue
+        index[root] = lowlink[root] = counter
+        counter += 1
+        stack.push_back(root)
+        on_stack[root] = 1
+        frames.push_back(root)
+        edges.push_back(0)
+        while not frames.empty():
+            v, e = frames.back(), edges.back()
+            if e < m:
+                edges[edges.size() - 1] += 1
+                w = graph[v, e]
+                if index[w] == undefined:
+                    index[w] = lowlink[w] = counter
+                    counter += 1
+                    stack.push_back(w)
+                    on_stack[w] = 1
+                    frames.push_back(w)
+                    edges.push_back(0)
+                elif on_stack[w] and index[w] < lowlink[v]:
+                    lowlink[v] = index[w]
+                continue
+            frames.pop_back()
+            edges.pop_back()
+            if lowlink[v] == index[v]:
+                # v is the root of a component, which is on top of the stack
+                w = undefined
+                while w != v:
+                    w = stack.back()
+                    stack.pop_back()
+                    on_stack[w] = 0
+                    out[w] = nr_components
+                nr_components += 1
+            if not frames.empty() and lowlink[v] < lowlink[frames.back()]:
+                lowlink[frames[frames.size() - 1]] = lowlink[v]
+    # the components are labelled in the order of their completion
+    relabel.resize(nr_components, undefined)
+    counter = 0
+    for v in range(n):
+        if relabel[out[v]] == undefined:
+            relabel[out[v]] = counter
+            counter += 1
+        out[v] = relabel[out[v]]
 
 # TODO Currently there seems to be no point in putting this into semigrp.py
 # since almost every method has no checks but just calls the corresponding
@@ -348,9 +2063,24 @@ cdef class SemigroupNC:
     # holds a pointer to the C++ instance which we're wrapping
     cdef libsemigroups.Semigroup* _handle      
     cdef ElementABC _an_element
+    # held while calling any method of _handle which may enumerate, since the
+    # GIL is released during enumeration
+    cdef object _lock
+    # whether the GIL can be released while multiplying the elements, see
+    # _products_release_gil
+    cdef bint _nogil
+    # arrays describing the fully enumerated semigroup, such as its Cayley
+    # graphs, and its generators, from which its size, elements and so on are
+    # found without enumerating it; see Semigroup.load
+    cdef object _precomputed
+    cdef list _precomputed_gens
 
     def __cinit__(self):
         self._handle = NULL
+        self._lock = threading.RLock()
+        self._nogil = False
+        self._precomputed = None
+        self._precomputed_gens = None
 
     def __init__(self, gens):
         cdef vector[libsemigroups.Element *] cpp_gens
@@ -358,6 +2088,31 @@ cdef class SemigroupNC:
             cpp_gens.push_back((<ElementABC>g)._handle)
         self._handle = new libsemigroups.Semigroup(cpp_gens)
         self._an_element = gens[0]
+        self._nogil = _products_release_gil(gens[0])
+        if isinstance(gens[0], PythonElementNC):
+            # wrapped Python objects must only be multiplied while holding the
+            # GIL, and so by a single thread
+            self._handle.set_max_threads(1)
+        elif _default_max_threads is not None:
+            self._handle.set_max_threads(_default_max_threads)
+
+    cdef _enumerate(self, size_t limit):
+        # Enumerate self until it has at least <limit> elements, or is fully
+        # enumerated, one batch at a time. The GIL is released during each
+        # batch, and interrupts are checked for between batches, so that an
+        # interrupted enumeration can be resumed.
+        cdef size_t target
+        with self._lock:
+            while (not self._handle.is_done()
+                   and self._handle.current_size() < limit):
+                target = min(limit, self._handle.current_size()
+                                    + self._handle.batch_size())
+                if self._nogil:
+                    with nogil:
+                        self._handle.enumerate(target)
+                else:
+                    self._handle.enumerate(target)
+                sig_check()
 
     def __dealloc__(self):
         del self._handle
@@ -366,12 +2121,97 @@ cdef class SemigroupNC:
         return self._handle.current_max_word_length()
 
     def nridempotents(self):
-        return self._handle.nridempotents()
+        self._enumerate(<size_t> -1)
+        with self._lock:
+            return self._handle.nridempotents()
+
+    def is_idempotent_mask(self):
+        '''
+        Function for finding which elements of a semigroup are idempotents.
+
+        The semigroup is fully enumerated first, and then the idempotents are
+        found by libsemigroups as in :meth:`nridempotents`, using up to the
+        maximum number of threads of the semigroup.
+
+        Returns:
+            numpy.ndarray: An array of bools, whose i-th entry is whether the
+            element in position i is an idempotent
+
+        Example:
+            >>> from semigroups import Semigroup, Transformation
+            >>> S = Semigroup(Transformation([1, 0]), Transformation([0, 0]))
+            >>> S.is_idempotent_mask()
+            array([False,  True,  True,  True])
+        '''
+        self.nridempotents()
+        cdef size_t pos
+        cdef uint8_t[::1] view
+        with self._lock:
+            out = numpy.empty(self._handle.current_size(), dtype=numpy.uint8)
+            if out.size > 0:
+                view = out
+                with nogil:
+                    for pos in range(view.shape[0]):
+                        view[pos] = self._handle.is_idempotent(pos)
+        return out.view(numpy.bool_)
+
+    def idempotents(self):
+        '''
+        Function for finding the positions of the idempotents of a semigroup,
+        see :meth:`is_idempotent_mask`.
+
+        Returns:
+            numpy.ndarray: The positions of the idempotents in increasing
+            order, whose dtype is uint32 (or uint64 if the semigroup has more
+            than 2 ** 32 - 2 elements)
+
+        Example:
+            >>> from semigroups import Semigroup, Transformation
+            >>> S = Semigroup(Transformation([1, 0]), Transformation([0, 0]))
+            >>> S.idempotents()
+            array([1, 2, 3], dtype=uint32)
+        '''
+        mask = self.is_idempotent_mask()
+        dtype = numpy.uint32 if mask.size < 0xFFFFFFFF else numpy.uint64
+        return numpy.flatnonzero(mask).astype(dtype)
     
     def is_done(self):
+        if self._precomputed is not None:
+            return True
         return self._handle.is_done()
+
+    def set_max_threads(self, nr_threads):
+        '''
+        Sets the maximum number of threads to be used at once by the
+        multi-threaded methods of this semigroup, such as
+        :meth:`nridempotents`. The default is set by
+        :func:`set_default_max_threads`.
+
+        Semigroups of wrapped Python objects always use a single thread.
+
+        Args:
+            nr_threads (int):   The number of threads
+
+        Raises:
+            TypeError:  If ``nr_threads`` is not an int.
+            ValueError: If ``nr_threads`` is not positive.
+        '''
+        _check_nr_threads(nr_threads)
+        if not isinstance(self._an_element, PythonElementNC):
+            with self._lock:
+                self._handle.set_max_threads(nr_threads)
+
+    def current_size(self):
+        if self._precomputed is not None:
+            return len(self._precomputed['length'])
+        return self._handle.current_size()
+
+    def batch_size(self):
+        return self._handle.batch_size()
     
     def is_begun(self):
+        if self._precomputed is not None:
+            return True
         return self._handle.is_begun()
     
     def current_position(self, ElementABC x):
@@ -381,7 +2221,8 @@ cdef class SemigroupNC:
         return pos
     
     def __contains__(self, ElementABC x):
-        return self._handle.test_membership(x._handle)
+        with self._lock:
+            return self._handle.test_membership(x._handle)
 
     def set_report(self, val):
         if val == True:
@@ -397,17 +2238,262 @@ cdef class SemigroupNC:
         [1, 0, 2, 1, 0, 2, 1, 0, 2, 1]
         >>> S[1] * S[0] * S[2] * S[1] * S[0] * S[2] * S[1] * S[0] * S[2] * S[1]
         '''
-        pos = self._handle.position(x._handle)
-        if pos == -1:
+        cdef size_t pos
+        with self._lock:
+            pos = self._handle.position(x._handle)
+        if pos == <size_t> -1:
             return None # TODO Ok?
-        cdef vector[size_t]* c_word = self._handle.factorisation(pos)
+        cdef vector[size_t]* c_word
+        with self._lock:
+            c_word = self._handle.factorisation(pos)
         assert c_word != NULL
         py_word = [letter for letter in c_word[0]]
         del c_word
         return py_word
     
+    def factorisations(self, elements=None):
+        '''
+        Function for finding the words in the generators representing many
+        elements of a semigroup.
+
+        The words are the short-lex least words representing the elements,
+        as returned by :meth:`factorisation`, and they are computed in a
+        single loop from the prefixes and final letters of the elements. They
+        are returned in compressed sparse row form: the word of the i-th
+        element is ``words[offsets[i]:offsets[i + 1]]``.
+
+        Args:
+            elements (list):    Elements of the semigroup, or their positions
+                                (by default, all of the elements, in which
+                                case the semigroup is fully enumerated)
+
+        Returns:
+            tuple: The arrays ``words``, whose dtype is uint32, and
+            ``offsets``, whose dtype is uint64
+
+        Raises:
+            TypeError:  If the elements are of a different type.
+            ValueError: If an element does not belong to the semigroup, or a
+                        position is not the position of an element.
+
+        Example:
+            >>> from semigroups import Semigroup, Transformation
+            >>> S = Semigroup(Transformation([1, 0]), Transformation([0, 0]))
+            >>> words, offsets = S.factorisations()
+            >>> words
+            array([0, 1, 0, 0, 1, 0], dtype=uint32)
+            >>> offsets
+            array([0, 1, 2, 4, 6], dtype=uint64)
+        '''
+        cdef vector[size_t] positions
+        cdef ElementABC x
+        cdef size_t pos, i, j, k
+        cdef const int64_t[::1] array_view
+        if elements is None:
+            if self._precomputed is None:
+                self._enumerate(<size_t> -1)
+            for pos in range(<size_t> self.current_size()):
+                positions.push_back(pos)
+        elif (isinstance(elements, (list, tuple)) and len(elements) > 0
+                and isinstance(elements[0], ElementABC)):
+            for x in elements:
+                if not isinstance(x, type(self._an_element)):
+                    raise TypeError('the elements must be of the same type '
+                                    + 'as those of the semigroup')
+                with self._lock:
+                    pos = self._handle.position(x._handle)
+                if pos == <size_t> -1:
+                    raise ValueError('the element %s does not belong to the '
+                                     % x + 'semigroup')
+                positions.push_back(pos)
+        else:
+            array = numpy.asarray(elements, dtype=numpy.int64).ravel()
+            if array.size > 0:
+                if array.min() < 0:
+                    raise ValueError('the positions must be non-negative')
+                if self._precomputed is None:
+                    self._enumerate(array.max() + 1)
+                if array.max() >= self.current_size():
+                    raise ValueError('the position %d is not the position of '
+                                     % array.max() + 'an element')
+            array_view = numpy.ascontiguousarray(array)
+            positions.resize(array_view.shape[0])
+            with nogil:
+                for i in range(positions.size()):
+                    positions[i] = array_view[i]
+        if self._precomputed is not None:
+            return self._precomputed_factorisations(positions)
+
+        k = positions.size()
+        offsets = numpy.empty(k + 1, dtype=numpy.uint64)
+        cdef uint64_t[::1] offsets_view = offsets
+        cdef uint32_t[::1] words_view
+        with self._lock:
+            with nogil:
+                offsets_view[0] = 0
+                for i in range(k):
+                    offsets_view[i + 1] = (offsets_view[i]
+                                           + self._handle.length_const(
+                                               positions[i]))
+            words = numpy.empty(offsets_view[k], dtype=numpy.uint32)
+            if offsets_view[k] > 0:
+                words_view = words
+                with nogil:
+                    for i in range(k):
+                        # the word is written from its final letter backwards
+                        pos, j = positions[i], offsets_view[i + 1]
+                        while pos != <size_t> -1:
+                            j -= 1
+                            words_view[j] = self._handle.final_letter(pos)
+                            pos = self._handle.prefix(pos)
+        return words, offsets
+
+    cdef _precomputed_factorisations(self, vector[size_t]& positions):
+        # As factorisations, but with the words of the elements in
+        # <positions> read from the saved prefixes, final letters and lengths,
+        # rather than from the enumerated semigroup
+        cdef size_t undefined = numpy.iinfo(
+            self._precomputed['prefix'].dtype).max
+        cdef const uint64_t[::1] prefix = numpy.ascontiguousarray(
+            self._precomputed['prefix'], dtype=numpy.uint64)
+        cdef const uint64_t[::1] final_letter = numpy.ascontiguousarray(
+            self._precomputed['final_letter'], dtype=numpy.uint64)
+        cdef const uint64_t[::1] length = numpy.ascontiguousarray(
+            self._precomputed['length'], dtype=numpy.uint64)
+        cdef size_t pos, i, j, k = positions.size()
+        offsets = numpy.empty(k + 1, dtype=numpy.uint64)
+        cdef uint64_t[::1] offsets_view = offsets
+        cdef uint32_t[::1] words_view
+        with nogil:
+            offsets_view[0] = 0
+            for i in range(k):
+                offsets_view[i + 1] = offsets_view[i] + length[positions[i]]
+        words = numpy.empty(offsets_view[k], dtype=numpy.uint32)
+        if offsets_view[k] > 0:
+            words_view = words
+            with nogil:
+                for i in range(k):
+                    pos, j = positions[i], offsets_view[i + 1]
+                    while pos != undefined:
+                        j -= 1
+                        words_view[j] = final_letter[pos]
+                        pos = prefix[pos]
+        return words, offsets
+
+    def evaluate(self, word):
+        '''
+        Function for finding the position of the element of a semigroup
+        represented by a word in the generators, see :meth:`evaluate_many`.
+
+        Args:
+            word (list):    The indices of the generators
+
+        Returns:
+            int: The position of the element
+
+        Raises:
+            ValueError: If the word is empty or contains a letter which is
+                        not the index of a generator.
+
+        Example:
+            >>> from semigroups import Semigroup, Transformation
+            >>> S = Semigroup(Transformation([1, 0]), Transformation([0, 0]))
+            >>> S.evaluate([1, 0])
+            3
+            >>> S[3]
+            Transformation([1, 1])
+        '''
+        return int(self.evaluate_many(word, [0, len(word)])[0])
+
+    def evaluate_many(self, words, offsets):
+        '''
+        Function for finding the positions of the elements of a semigroup
+        represented by many words in the generators.
+
+        The words are given in compressed sparse row form, as returned by
+        :meth:`factorisations`: the i-th word is
+        ``words[offsets[i]:offsets[i + 1]]``. The semigroup is fully
+        enumerated, and then each word is evaluated by following the right
+        Cayley graph from the position of its first letter, in a single loop
+        which does not multiply any elements, and which releases the GIL
+        unless the elements are wrapped Python objects, bipartitions or PBRs.
+
+        Args:
+            words (list):   The letters of the words
+            offsets (list): The positions in ``words`` at which each word
+                            starts, followed by ``len(words)``
+
+        Returns:
+            numpy.ndarray: The positions of the elements, whose dtype is
+            uint32 (or uint64 if the semigroup has more than 2 ** 32 - 2
+            elements)
+
+        Raises:
+            ValueError: If one of the words is empty or contains a letter
+                        which is not the index of a generator, or the
+                        offsets are not of the form described above.
+
+        Example:
+            >>> from semigroups import Semigroup, Transformation
+            >>> S = Semigroup(Transformation([1, 0]), Transformation([0, 0]))
+            >>> S.evaluate_many([0, 0, 1, 0, 1], [0, 2, 4, 5])
+            array([2, 3, 1], dtype=uint32)
+        '''
+        words = numpy.asarray(words, dtype=numpy.int64).ravel()
+        offsets = numpy.asarray(offsets, dtype=numpy.int64).ravel()
+        if (offsets.size == 0 or offsets[0] != 0
+                or offsets[-1] != words.size
+                or (numpy.diff(offsets) <= 0).any()):
+            raise ValueError('the offsets must be strictly increasing from 0 '
+                             + 'to the number of letters')
+        if words.size > 0 and (words.min() < 0
+                               or words.max() >= self._handle.nrgens()):
+            raise ValueError('the letters must be the indices of generators')
+
+        cdef size_t i, j, k = offsets.size - 1, pos
+        out = numpy.empty(k, dtype=numpy.uint64)
+        if k == 0:
+            return out.astype(numpy.uint32)
+        # Semigroup::right enumerates the semigroup, which must therefore be
+        # done before the GIL is released
+        self._enumerate(<size_t> -1)
+        cdef uint64_t[::1] words_view = words.astype(numpy.uint64)
+        cdef uint64_t[::1] offsets_view = offsets.astype(numpy.uint64)
+        cdef uint64_t[::1] out_view = out
+        with self._lock:
+            if self._nogil:
+                with nogil:
+                    for i in range(k):
+                        pos = self._handle.letter_to_pos(
+                            words_view[offsets_view[i]])
+                        for j in range(offsets_view[i] + 1,
+                                       offsets_view[i + 1]):
+                            pos = self._handle.right(pos, words_view[j])
+                        out_view[i] = pos
+            else:
+                for i in range(k):
+                    pos = self._handle.letter_to_pos(
+                        words_view[offsets_view[i]])
+                    for j in range(offsets_view[i] + 1, offsets_view[i + 1]):
+                        pos = self._handle.right(pos, words_view[j])
+                    out_view[i] = pos
+            size = self._handle.current_size()
+        dtype = numpy.uint32 if size < 0xFFFFFFFF else numpy.uint64
+        return out.astype(dtype)
+
     def enumerate(self, limit):
-        self._handle.enumerate(limit)
+        '''
+        Enumerate at least ``limit`` elements of this semigroup, or all of
+        them if there are fewer.
+
+        The GIL is released during the enumeration, unless the elements are
+        wrapped Python objects, bipartitions or PBRs, and the enumeration can
+        be interrupted.
+
+        Args:
+            limit (int):    The number of elements to enumerate
+        '''
+        self._enumerate(limit)
 
     def size(self):
         """
@@ -420,13 +2506,23 @@ cdef class SemigroupNC:
             ...                Transformation([2, 3, 2, 3, 5, 5])])
             >>> S.size()
             5
+
+        The GIL is released while the semigroup is enumerated, unless its
+        elements are wrapped Python objects, bipartitions or PBRs, and the
+        enumeration can be interrupted (and later resumed).
         """
-        # Plausibly wrap in sig_off / sig_on
+        if self._precomputed is not None:
+            return len(self._precomputed['length'])
+        self._enumerate(<size_t> -1)
         return self._handle.size()
 
     cdef new_from_handle(self, libsemigroups.Element* handle):
         return self._an_element.new_from_handle(handle)
 
+    cdef new_view(self, libsemigroups.Element* handle):
+        # The elements of self are returned as views, which keep self alive.
+        return self._an_element.new_view(handle, self)
+
     def __getitem__(self, size_t pos):
         """
         Return the ``pos``-th element of ``self``.
@@ -444,12 +2540,634 @@ cdef class SemigroupNC:
             >>> S[3]
             (1-0j)
         """
+        if self._precomputed is not None:
+            if pos >= <size_t> self.current_size():
+                return None
+            # the product of the generators in the factorisation of the
+            # element, read from the saved prefixes and final letters
+            prefix = self._precomputed['prefix']
+            final_letter = self._precomputed['final_letter']
+            undefined = numpy.iinfo(prefix.dtype).max
+            word, current = [], pos
+            while current != undefined:
+                word.append(int(final_letter[current]))
+                current = int(prefix[current])
+            x = self._precomputed_gens[word.pop()].copy()
+            while len(word) > 0:
+                x = x * self._precomputed_gens[word.pop()]
+            return x
         cdef libsemigroups.Element* element
-        element = self._handle.at(pos)
+        with self._lock:
+            element = self._handle.at(pos)
         if element == NULL:
             return None
         else:
-            return self.new_from_handle(element)
+            return self.new_view(element)
+
+    def elements_array(self):
+        '''
+        Function for exporting all of the elements of a semigroup as an array.
+
+        The semigroup is fully enumerated, and then the data of its elements
+        is copied into the array in a single loop. Row ``i`` of the array
+        corresponds to the element in position ``i``, and is:
+
+        * the images, as in ``as_array``, for transformations and partial
+          perms;
+        * the blocks lookup for bipartitions;
+        * the rows packed into bytes, as in ``to_numpy(packed=True)``, for
+          boolean matrices.
+
+        Returns:
+            numpy.ndarray: An array of shape ``(size, degree)`` for
+            transformations and partial perms, ``(size, 2 * degree)`` for
+            bipartitions, and ``(size, degree, ceil(degree / 8))`` for boolean
+            matrices
+
+        Raises:
+            TypeError:  If the elements are of any other type.
+
+        Example:
+            >>> from semigroups import Semigroup, Transformation
+            >>> S = Semigroup(Transformation([1, 0, 1]))
+            >>> S.elements_array()
+            array([[1, 0, 1],
+                   [0, 1, 0]], dtype=uint8)
+        '''
+        if (self._precomputed is not None
+                and 'elements' in self._precomputed):
+            return self._precomputed['elements']
+        self._enumerate(<size_t> -1)
+        cdef vector[libsemigroups.Element*] elements
+        cdef size_t pos
+        with self._lock:
+            for pos in range(self._handle.current_size()):
+                elements.push_back(self._handle.at(pos))
+            return self._an_element._elements_array(elements)
+
+    def contains_many(self, elements):
+        '''
+        Function for testing whether many elements belong to a semigroup.
+
+        The semigroup is fully enumerated first, if necessary, and then every
+        element is looked up in a single loop, which releases the GIL unless
+        the elements are wrapped Python objects, bipartitions or PBRs.
+
+        Args:
+            elements (list):    Elements of the same type as those of the
+                                semigroup, or an array in the format
+                                returned by :meth:`elements_array`
+
+        Returns:
+            numpy.ndarray: An array of bools, whose i-th entry is whether the
+            i-th element belongs to the semigroup
+
+        Raises:
+            TypeError:  If the elements are of a different type.
+            ValueError: If ``elements`` is an array which does not represent
+                        elements of this type.
+
+        Example:
+            >>> from semigroups import Semigroup, Transformation
+            >>> S = Semigroup(Transformation([1, 0, 1]))
+            >>> S.contains_many([Transformation([0, 1, 0]),
+            ...                  Transformation([0, 1, 2])])
+            array([ True, False])
+            >>> S.contains_many([[1, 0, 1], [1, 1, 1]])
+            array([ True, False])
+        '''
+        cdef vector[libsemigroups.Element*] c_elements
+        cdef ElementABC x
+        cdef bint owned = not isinstance(elements, (list, tuple))
+        if owned:
+            c_elements = self._an_element._new_elements_from_array(elements)
+        elif len(elements) > 0 and not isinstance(elements[0], ElementABC):
+            c_elements = self._an_element._new_elements_from_array(elements)
+            owned = True
+        else:
+            for x in elements:
+                if not isinstance(x, type(self._an_element)):
+                    raise TypeError('the elements must be of the same type '
+                                    + 'as those of the semigroup')
+                c_elements.push_back(x._handle)
+
+        out = numpy.empty(c_elements.size(), dtype=numpy.uint8)
+        cdef uint8_t[::1] view = out
+        cdef size_t i
+        try:
+            self._enumerate(<size_t> -1)
+            with self._lock:
+                if self._nogil:
+                    with nogil:
+                        for i in range(c_elements.size()):
+                            view[i] = self._handle.test_membership(
+                                c_elements[i])
+                else:
+                    for i in range(c_elements.size()):
+                        view[i] = self._handle.test_membership(c_elements[i])
+        finally:
+            if owned:
+                _delete_elements(c_elements)
+        return out.view(numpy.bool_)
+
+    def nrgens(self):
+        return self._handle.nrgens()
+
+    def _positions_array(self, positions):
+        # Fully enumerate self, and return positions as an array of dtype
+        # uint64, after checking that they are the positions of elements.
+        self._enumerate(<size_t> -1)
+        array = numpy.asarray(positions, dtype=numpy.int64)
+        if array.size > 0:
+            if array.min() < 0:
+                raise ValueError('the positions must be non-negative')
+            if array.max() >= self._handle.current_size():
+                raise ValueError('the position %d is not the position of '
+                                 % array.max() + 'an element')
+        return array.astype(numpy.uint64)
+
+    def product_by_position(self, i, j):
+        '''
+        Function for finding the position of the product of two elements of a
+        semigroup, given their positions.
+
+        The semigroup is fully enumerated first. The product is found as in
+        libsemigroups, either by following the Cayley graphs or by
+        multiplying the elements, whichever is expected to be faster.
+
+        Args:
+            i (int):    The position of the left factor
+            j (int):    The position of the right factor
+
+        Returns:
+            int: The position of the product
+
+        Raises:
+            ValueError: If ``i`` or ``j`` is not the position of an element.
+
+        Example:
+            >>> from semigroups import Semigroup, Transformation
+            >>> S = Semigroup(Transformation([1, 0]), Transformation([0, 0]))
+            >>> S.product_by_position(1, 0)
+            3
+            >>> S[1] * S[0] == S[3]
+            True
+        '''
+        return int(self.products(i, j))
+
+    def products(self, lefts, rights):
+        '''
+        Function for finding the positions of many products of elements of a
+        semigroup, given the positions of their factors.
+
+        The arrays of positions are broadcast against each other, and the
+        products are found as in :meth:`product_by_position`, in a single loop
+        which releases the GIL unless the elements are wrapped Python
+        objects, bipartitions or PBRs.
+
+        Args:
+            lefts (list):   The positions of the left factors
+            rights (list):  The positions of the right factors
+
+        Returns:
+            numpy.ndarray: The positions of the products, whose dtype is
+            uint32 (or uint64 if the semigroup has more than 2 ** 32 - 2
+            elements)
+
+        Raises:
+            ValueError: If one of the positions is not the position of an
+                        element, or the arrays cannot be broadcast.
+
+        Example:
+            >>> from semigroups import Semigroup, Transformation
+            >>> S = Semigroup(Transformation([1, 0]), Transformation([0, 0]))
+            >>> S.products([0, 1, 2, 3], 0)
+            array([2, 3, 0, 1], dtype=uint32)
+        '''
+        lefts, rights = numpy.broadcast_arrays(self._positions_array(lefts),
+                                               self._positions_array(rights))
+        shape = lefts.shape
+        cdef uint64_t[::1] lefts_view = numpy.ascontiguousarray(lefts).ravel()
+        cdef uint64_t[::1] rights_view = numpy.ascontiguousarray(
+            rights).ravel()
+        out = numpy.empty(lefts_view.shape[0], dtype=numpy.uint64)
+        cdef uint64_t[::1] out_view = out
+        cdef size_t k
+        with self._lock:
+            if self._nogil:
+                with nogil:
+                    for k in range(out_view.shape[0]):
+                        out_view[k] = self._handle.fast_product(
+                            lefts_view[k], rights_view[k])
+            else:
+                for k in range(out_view.shape[0]):
+                    out_view[k] = self._handle.fast_product(lefts_view[k],
+                                                            rights_view[k])
+            size = self._handle.current_size()
+        dtype = numpy.uint32 if size < 0xFFFFFFFF else numpy.uint64
+        return out.astype(dtype).reshape(shape)
+
+    def multiplication_table(self, path=None):
+        '''
+        Function for finding the multiplication table of a semigroup.
+
+        The semigroup is fully enumerated first. Entry ``[i, j]`` of the
+        returned array is the position of the product of the elements in
+        positions ``i`` and ``j``, found as in :meth:`product_by_position`.
+        The table has ``size ** 2`` entries, and so this is only suitable for
+        small semigroups; if ``path`` is given, then the table is written to
+        a memory-mapped ``.npy`` file instead of being held in memory, and it
+        can be opened again with ``numpy.load(path, mmap_mode='r')``.
+
+        Args:
+            path (str):     The file to write the table to (optional)
+
+        Returns:
+            numpy.ndarray: An array of shape ``(size, size)`` whose dtype is
+            uint32, or a ``numpy.memmap`` if ``path`` is given
+
+        Raises:
+            ValueError: If the semigroup has more than 2 ** 32 - 1 elements.
+
+        Example:
+            >>> from semigroups import Semigroup, Transformation
+            >>> S = Semigroup(Transformation([1, 0]), Transformation([0, 0]))
+            >>> S.multiplication_table()
+            array([[2, 1, 0, 3],
+                   [3, 1, 1, 3],
+                   [0, 1, 2, 3],
+                   [1, 1, 3, 3]], dtype=uint32)
+        '''
+        self._enumerate(<size_t> -1)
+        cdef size_t i, j, size = self._handle.current_size()
+        if size > 0xFFFFFFFF:
+            raise ValueError('the semigroup is too large')
+        if path is None:
+            out = numpy.empty((size, size), dtype=numpy.uint32)
+        else:
+            out = numpy.lib.format.open_memmap(path, mode='w+',
+                                               dtype=numpy.uint32,
+                                               shape=(size, size))
+        if size == 0:
+            return out
+        cdef uint32_t[:, ::1] view = out
+        with self._lock:
+            # one row at a time, so that the computation can be interrupted
+            for i in range(size):
+                if self._nogil:
+                    with nogil:
+                        for j in range(size):
+                            view[i, j] = self._handle.fast_product(i, j)
+                else:
+                    for j in range(size):
+                        view[i, j] = self._handle.fast_product(i, j)
+                sig_check()
+        if path is not None:
+            out.flush()
+        return out
+
+    def _set_precomputed(self, gens, arrays):
+        # Answer size, indexing, elements_array, right_cayley_graph and so on
+        # from the generators <gens> and the dict <arrays> read by
+        # Semigroup.load, rather than by enumerating self. The methods which
+        # look up or multiply elements still enumerate self, in the same
+        # order, when they are first called.
+        if len(set(len(array) for array in arrays.values())) != 1:
+            raise ValueError('the saved arrays have different lengths')
+        self._precomputed = arrays
+        self._precomputed_gens = list(gens)
+
+    cdef _cayley_graph(self, bint right):
+        if self._precomputed is not None:
+            return self._precomputed[
+                'right_cayley_graph' if right else 'left_cayley_graph']
+        self._enumerate(<size_t> -1)
+        cdef size_t pos, j, size, nrgens
+        cdef uint32_t[:, ::1] view32
+        cdef uint64_t[:, ::1] view64
+        with self._lock:
+            size, nrgens = self._handle.current_size(), self._handle.nrgens()
+            if size <= 0xFFFFFFFF:
+                out = numpy.empty((size, nrgens), dtype=numpy.uint32)
+            else:
+                out = numpy.empty((size, nrgens), dtype=numpy.uint64)
+            if size == 0 or nrgens == 0:
+                return out
+            elif out.dtype == numpy.uint32:
+                view32 = out
+                with nogil:
+                    for pos in range(size):
+                        for j in range(nrgens):
+                            view32[pos, j] = (
+                                self._handle.right(pos, j) if right
+                                else self._handle.left(pos, j))
+            else:
+                view64 = out
+                with nogil:
+                    for pos in range(size):
+                        for j in range(nrgens):
+                            view64[pos, j] = (
+                                self._handle.right(pos, j) if right
+                                else self._handle.left(pos, j))
+        return out
+
+    def _index_array(self, name):
+        # Return the array whose i-th entry is the prefix, suffix, first
+        # letter, final letter or length of the element in position i, where
+        # name is the corresponding key of _precomputed. Undefined entries
+        # (the prefixes and suffixes of generators) are the largest value of
+        # the dtype.
+        if self._precomputed is not None:
+            return self._precomputed[name]
+        self._enumerate(<size_t> -1)
+        cdef size_t pos, size, value
+        cdef int which = ['prefix', 'suffix', 'first_letter', 'final_letter',
+                          'length'].index(name)
+        cdef uint64_t[::1] view
+        with self._lock:
+            size = self._handle.current_size()
+            out = numpy.empty(size, dtype=numpy.uint64)
+            if size > 0:
+                view = out
+                with nogil:
+                    for pos in range(size):
+                        if which == 0:
+                            value = self._handle.prefix(pos)
+                        elif which == 1:
+                            value = self._handle.suffix(pos)
+                        elif which == 2:
+                            value = self._handle.first_letter(pos)
+                        elif which == 3:
+                            value = self._handle.final_letter(pos)
+                        else:
+                            value = self._handle.length_const(pos)
+                        view[pos] = value
+        dtype = numpy.uint32 if size < 0xFFFFFFFF else numpy.uint64
+        return out.astype(dtype)
+
+    def prefixes(self):
+        '''
+        Function for finding the prefixes of the elements of a semigroup.
+
+        The semigroup is fully enumerated first. Every element which is not a
+        generator is the product of its prefix and its final letter, and of
+        its first letter and its suffix. Together with the arrays returned by
+        :meth:`suffixes`, :meth:`first_letters`, :meth:`final_letters` and
+        :meth:`word_lengths`, this encodes the factorisations of all of the
+        elements.
+
+        Returns:
+            numpy.ndarray: The positions of the prefixes, whose dtype is
+            uint32 (or uint64 if the semigroup has more than 2 ** 32 - 2
+            elements); the entries for generators are the largest value of
+            the dtype
+
+        Example:
+            >>> from semigroups import Semigroup, Transformation
+            >>> S = Semigroup(Transformation([1, 0]), Transformation([0, 0]))
+            >>> S.prefixes()
+            array([4294967295, 4294967295,          0,          1], dtype=uint32)
+        '''
+        return self._index_array('prefix')
+
+    def suffixes(self):
+        '''
+        Function for finding the suffixes of the elements of a semigroup, see
+        :meth:`prefixes`.
+
+        Returns:
+            numpy.ndarray: The positions of the suffixes, as for
+            :meth:`prefixes`
+        '''
+        return self._index_array('suffix')
+
+    def first_letters(self):
+        '''
+        Function for finding the first letters of the elements of a
+        semigroup, see :meth:`prefixes`.
+
+        Returns:
+            numpy.ndarray: The indices of the generators which are the first
+            letters
+        '''
+        return self._index_array('first_letter')
+
+    def final_letters(self):
+        '''
+        Function for finding the final letters of the elements of a
+        semigroup, see :meth:`prefixes`.
+
+        Returns:
+            numpy.ndarray: The indices of the generators which are the final
+            letters
+        '''
+        return self._index_array('final_letter')
+
+    def word_lengths(self):
+        '''
+        Function for finding the lengths of the short-lex least words
+        representing the elements of a semigroup, see :meth:`prefixes`.
+
+        Returns:
+            numpy.ndarray: The lengths of the words
+
+        Example:
+            >>> from semigroups import Semigroup, Transformation
+            >>> S = Semigroup(Transformation([1, 0]), Transformation([0, 0]))
+            >>> S.word_lengths()
+            array([1, 1, 2, 2], dtype=uint32)
+        '''
+        return self._index_array('length')
+
+    def right_cayley_graph(self):
+        '''
+        Function for finding the right Cayley graph of a semigroup.
+
+        The semigroup is fully enumerated first. Entry ``[i, j]`` of the
+        returned array is the position of the product of the element in
+        position ``i`` and the generator ``j``.
+
+        Returns:
+            numpy.ndarray: An array of shape ``(size, nrgens)``, whose dtype
+            is uint32 (or uint64 if the semigroup has more than 2 ** 32 - 1
+            elements)
+
+        Example:
+            >>> from semigroups import Semigroup, Transformation
+            >>> S = Semigroup(Transformation([1, 0]), Transformation([0, 0]))
+            >>> S.right_cayley_graph()
+            array([[2, 1],
+                   [3, 1],
+                   [0, 1],
+                   [1, 1]], dtype=uint32)
+        '''
+        return self._cayley_graph(True)
+
+    def left_cayley_graph(self):
+        '''
+        Function for finding the left Cayley graph of a semigroup.
+
+        The semigroup is fully enumerated first. Entry ``[i, j]`` of the
+        returned array is the position of the product of the generator ``j``
+        and the element in position ``i``.
+
+        Returns:
+            numpy.ndarray: An array of shape ``(size, nrgens)``, as for
+            :meth:`right_cayley_graph`
+        '''
+        return self._cayley_graph(False)
+
+    def _scc_labels(self, graph):
+        # Return the labels of the strongly connected components of <graph>,
+        # an array of shape (size, k) as returned by _cayley_graph.
+        out = numpy.empty(graph.shape[0], dtype=numpy.uint64)
+        cdef const uint64_t[:, ::1] graph_view = numpy.ascontiguousarray(
+            graph, dtype=numpy.uint64)
+        cdef uint64_t[::1] out_view = out
+        with nogil:
+            _scc_labels(graph_view, out_view)
+        dtype = numpy.uint32 if graph.shape[0] < 0xFFFFFFFF else numpy.uint64
+        return out.astype(dtype)
+
+    def r_classes(self):
+        '''
+        Function for finding the R-classes of a semigroup.
+
+        The semigroup is fully enumerated first. Two elements are R-related if
+        they generate the same principal right ideal, and so the R-classes
+        are the strongly connected components of the right Cayley graph,
+        which are found by Tarjan's algorithm without holding the GIL.
+
+        Returns:
+            numpy.ndarray: The labels of the R-classes of the elements,
+            which are 0, 1, 2, ... in the order in which the classes first
+            occur, and whose dtype is uint32 (or uint64 if the semigroup has
+            more than 2 ** 32 - 2 elements)
+
+        Example:
+            >>> from semigroups import Semigroup, Transformation
+            >>> S = Semigroup(Transformation([1, 0]), Transformation([0, 0]))
+            >>> S.r_classes()
+            array([0, 1, 0, 1], dtype=uint32)
+        '''
+        return self._scc_labels(self._cayley_graph(True))
+
+    def l_classes(self):
+        '''
+        Function for finding the L-classes of a semigroup, which are the
+        strongly connected components of the left Cayley graph, see
+        :meth:`r_classes`.
+
+        Returns:
+            numpy.ndarray: The labels of the L-classes of the elements, as
+            for :meth:`r_classes`
+
+        Example:
+            >>> from semigroups import Semigroup, Transformation
+            >>> S = Semigroup(Transformation([1, 0]), Transformation([0, 0]))
+            >>> S.l_classes()
+            array([0, 1, 0, 2], dtype=uint32)
+        '''
+        return self._scc_labels(self._cayley_graph(False))
+
+    def h_classes(self):
+        '''
+        Function for finding the H-classes of a semigroup, which are the
+        intersections of its R-classes and L-classes, see :meth:`r_classes`.
+
+        Returns:
+            numpy.ndarray: The labels of the H-classes of the elements, as
+            for :meth:`r_classes`
+
+        Example:
+            >>> from semigroups import Semigroup, Transformation
+            >>> S = Semigroup(Transformation([1, 0]), Transformation([0, 0]))
+            >>> S.h_classes()
+            array([0, 1, 0, 2], dtype=uint32)
+        '''
+        r_classes, l_classes = self.r_classes(), self.l_classes()
+        if r_classes.size == 0:
+            return r_classes
+        # the pair of labels of each element is encoded as a single integer
+        pairs = (r_classes.astype(numpy.uint64) * (int(l_classes.max()) + 1)
+                 + l_classes)
+        return normalise_labels(pairs)
+
+    def d_classes(self):
+        '''
+        Function for finding the D-classes of a semigroup.
+
+        The semigroup is fully enumerated first. Since the semigroup is
+        finite, two elements are D-related if and only if they generate the
+        same principal two-sided ideal, and so the D-classes are the strongly
+        connected components of the union of the right and left Cayley
+        graphs, see :meth:`r_classes`.
+
+        Returns:
+            numpy.ndarray: The labels of the D-classes of the elements, as
+            for :meth:`r_classes`
+
+        Example:
+            >>> from semigroups import Semigroup, Transformation
+            >>> S = Semigroup(Transformation([1, 0]), Transformation([0, 0]))
+            >>> S.d_classes()
+            array([0, 1, 0, 1], dtype=uint32)
+        '''
+        return self._scc_labels(numpy.hstack((self._cayley_graph(True),
+                                              self._cayley_graph(False))))
+
+    def stream(self, batch_size=None, positions=False):
+        '''
+        Function for iterating over the elements of a semigroup in batches,
+        as they are enumerated.
+
+        Each batch consists of elements which had not been enumerated when
+        the previous batch was returned, and the semigroup is enumerated only
+        as far as is required for the next batch, so this can be used on
+        semigroups which are too large to enumerate completely.
+
+        Args:
+            batch_size (int):   The maximum number of elements in each batch,
+                                by default the batch size of libsemigroups
+            positions (bool):   Whether to return the positions of the
+                                elements in each batch instead
+
+        Returns:
+            generator: Lists of elements, or if ``positions`` is ``True``,
+            arrays of their positions
+
+        Raises:
+            ValueError: If ``batch_size`` is not positive.
+
+        Example:
+            >>> from semigroups import FullTransformationMonoid
+            >>> S = FullTransformationMonoid(3)
+            >>> [len(batch) for batch in S.stream(10)]
+            [10, 10, 7]
+            >>> next(S.stream(3, positions=True))
+            array([0, 1, 2])
+        '''
+        if batch_size is None:
+            batch_size = self._handle.batch_size()
+        elif batch_size < 1:
+            raise ValueError('the argument (batch_size) must be positive')
+        cdef size_t start = 0, stop, pos
+        while True:
+            if self._precomputed is None:
+                self._enumerate(start + batch_size)
+            with self._lock:
+                stop = min(start + batch_size, self.current_size())
+                if stop == start:
+                    return
+                if not positions and self._precomputed is not None:
+                    batch = [self[pos] for pos in range(start, stop)]
+                elif not positions:
+                    batch = [self.new_view(self._handle.at(pos))
+                             for pos in range(start, stop)]
+            if positions:
+                batch = numpy.arange(start, stop)
+            yield batch
+            start = stop
 
     def __iter__(self):
         """
@@ -468,12 +3186,17 @@ cdef class SemigroupNC:
         """
         cdef size_t pos = 0
         cdef libsemigroups.Element* element
+        if self._precomputed is not None:
+            for pos in range(<size_t> self.current_size()):
+                yield self[pos]
+            return
         while True:
-            element = self._handle.at(pos)
+            with self._lock:
+                element = self._handle.at(pos)
             if element == NULL:
                 break
             else:
-                yield self.new_from_handle(element)
+                yield self.new_view(element)
             pos += 1
 
 cdef class FpSemigroupNC(SemigroupNC):
@@ -493,19 +3216,31 @@ cdef class FpSemigroupNC(SemigroupNC):
                                                         [],
                                                         rels)
         self._rws = new libsemigroups.RWS(rels)
+        if _default_max_threads is not None:
+            self._congruence.set_max_threads(_default_max_threads)
     
     def __dealloc__(self):
         del self._congruence
         del self._rws
 
     def size(self):
-        sig_on()
-        try:
-            return self._congruence.nr_classes()
-        finally:
-            sig_off()
+        with self._lock:
+            sig_on()
+            try:
+                return self._congruence.nr_classes()
+            finally:
+                sig_off()
         # FIXME must actually kill off the nr_classes process safely
 
+    def _nr_classes_nogil(self):
+        # Like size, but releasing the GIL rather than handling signals, for
+        # use outside of the main thread
+        cdef int out
+        with self._lock:
+            with nogil:
+                out = self._congruence.nr_classes()
+        return out
+
     def set_report(self, val):
         '''
         Sets whether or not to report data when running certain 
@@ -528,7 +3263,8 @@ cdef class FpSemigroupNC(SemigroupNC):
         Args:
             int:number of threads
         '''
-        return self._congruence.set_max_threads(nr_threads)
+        with self._lock:
+            return self._congruence.set_max_threads(nr_threads)
 
     def is_confluent(self):
         '''
@@ -557,4 +3293,6 @@ cdef class FpSemigroupNC(SemigroupNC):
         return self._rws.is_confluent()
 
     def word_to_class_index(self, word):
-        return self._congruence.word_to_class_index(self.__convert_word(word))
+        word = self.__convert_word(word)
+        with self._lock:
+            return self._congruence.word_to_class_index(word)
@@ -1,6 +1,10 @@
 #include <Python.h>
 #include <libsemigroups/semigroups.h>
 
+#include <cstdint>
+#include <functional>
+#include <vector>
+
 namespace libsemigroups {
 
   /*
@@ -81,4 +85,87 @@ namespace libsemigroups {
     }
   };
 
+  // A boolean matrix of dimension at most 64, each of whose rows is stored as
+  // the bits of a single 64-bit word: the entry in column j is the bit
+  // 63 - j. Hence comparing the words of two matrices compares them in the
+  // same order as BooleanMat, and a row of a product is the bitwise or of
+  // some rows of the right factor.
+  class PackedBooleanMat : public Element {
+   private:
+    std::vector<uint64_t> _rows;
+
+   public:
+    explicit PackedBooleanMat(std::vector<uint64_t> const& rows)
+        : Element(), _rows(rows) {}
+
+    uint64_t* data() {
+      return _rows.data();
+    }
+
+    bool operator==(Element const& that) const override {
+      return _rows == static_cast<PackedBooleanMat const&>(that)._rows;
+    }
+
+    bool operator<(Element const& that) const override {
+      return _rows < static_cast<PackedBooleanMat const&>(that)._rows;
+    }
+
+    size_t complexity() const override {
+      return _rows.size() * _rows.size();
+    }
+
+    size_t degree() const override {
+      return _rows.size();
+    }
+
+    void cache_hash_value() const override {
+      size_t seed = 0;
+      for (uint64_t const& row : _rows) {
+        seed ^= std::hash<uint64_t>()(row) + 0x9e3779b9 + (seed << 6)
+                + (seed >> 2);
+      }
+      this->_hash_value = seed;
+    }
+
+    Element* identity() const override {
+      std::vector<uint64_t> rows(_rows.size(), 0);
+      for (size_t i = 0; i < rows.size(); ++i) {
+        rows[i] = static_cast<uint64_t>(1) << (63 - i);
+      }
+      return new PackedBooleanMat(rows);
+    }
+
+    Element* really_copy(size_t increase_deg_by = 0) const override {
+      PackedBooleanMat* copy = new PackedBooleanMat(_rows);
+      copy->_rows.resize(_rows.size() + increase_deg_by, 0);
+      return copy;
+    }
+
+    void copy(Element const* x) override {
+      _rows = static_cast<PackedBooleanMat const*>(x)->_rows;
+      this->reset_hash_value();
+    }
+
+    void really_delete() override {}
+
+    void redefine(Element const* x, Element const* y) override {
+      std::vector<uint64_t> const& xrows
+          = static_cast<PackedBooleanMat const*>(x)->_rows;
+      std::vector<uint64_t> const& yrows
+          = static_cast<PackedBooleanMat const*>(y)->_rows;
+      for (size_t i = 0; i < _rows.size(); ++i) {
+        uint64_t row  = 0;
+        uint64_t bits = xrows[i];
+        while (bits != 0) {
+          // the leftmost column j of row i of x which contains true
+          int j = __builtin_clzll(bits);
+          row |= yrows[j];
+          bits &= ~(static_cast<uint64_t>(1) << (63 - j));
+        }
+        _rows[i] = row;
+      }
+      this->reset_hash_value();
+    }
+  };
+
 };  // namespace libsemigroups
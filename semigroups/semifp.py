@@ -2,9 +2,18 @@
 This module contains the classes FpSemigroup and FpMonoid.
 '''
 # pylint: disable = no-member, len-as-condition, invalid-name
+import concurrent.futures
 import libsemigroups
 from semigroups.semigrp import Semigroup
 
+# The threads which compute the sizes of finitely presented semigroups for
+# FpSemigroup.size_async. These computations cannot be divided into steps, and
+# so they are not run by the worker thread shared by Semigroup.size_async and
+# so on, which they would block. The computations for a single semigroup are
+# run one at a time, since they hold its lock.
+_FP_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+
+
 class FpSemigroup(libsemigroups.FpSemigroupNC, Semigroup):
     '''
     A *finitely presented semigroup* is a quotient of a free semigroup on
@@ -172,6 +181,32 @@ class FpSemigroup(libsemigroups.FpSemigroupNC, Semigroup):
             return float('inf')
         return libsemigroups.FpSemigroupNC.size(self)
 
+    def size_async(self):
+        '''
+        Computes the number of elements of the finitely presented semigroup
+        without blocking.
+
+        The computation cannot be divided into steps, and so it is run by a
+        small pool of threads, rather than by the worker thread described in
+        :meth:`Semigroup.size_async`, so that it does not hold up other
+        asynchronous computations. It can only be cancelled before it starts.
+
+        Returns:
+            concurrent.futures.Future: a future whose result is the size of
+            the finitely presented semigroup.
+
+        Examples:
+            >>> FpSemigroup('ab',
+            ...             [['aa', 'a'], ['bbb', 'ab'], ['ab', 'ba']]
+            ...            ).size_async().result()
+            5
+        '''
+        def size():
+            if self.is_obviously_infinite():
+                return float('inf')
+            return libsemigroups.FpSemigroupNC._nr_classes_nogil(self)
+        return _FP_EXECUTOR.submit(size)
+
     def __contains__(self, word):
         if not isinstance(word, str):
             raise ValueError('word should be a string')
@@ -247,6 +282,11 @@ class FpSemigroup(libsemigroups.FpSemigroupNC, Semigroup):
             raise ValueError('given semigroup is infinite')
         return Semigroup.enumerate(self, limit)
 
+    def enumerate_async(self, limit):
+        if not self.is_finite():
+            raise ValueError('given semigroup is infinite')
+        return Semigroup.enumerate_async(self, limit)
+
     def nridempotents(self):
         if not self.is_finite():
             raise ValueError('given semigroup is infinite')
@@ -3,9 +3,22 @@ This module contains classes for representing semigroups.
 '''
 # pylint: disable = no-member, protected-access, invalid-name
 
+import binascii
+import collections
+import concurrent.futures
+import json
+import struct
+import threading
+import numpy
 import libsemigroups
-from semigroups.elements import Transformation
+from semigroups.elements import Transformation, PartialPerm, Bipartition
+from semigroups.elements import BooleanMat, PBR
 from libsemigroups import ElementABC, PythonElementNC
+# only imported to be re-exported by the package, see __init__.py
+# pylint: disable = unused-import
+from libsemigroups import set_default_max_threads  # noqa: F401
+from libsemigroups import default_max_threads  # noqa: F401
+# pylint: enable = unused-import
 
 
 class Semigroup(libsemigroups.SemigroupNC):
@@ -30,6 +43,275 @@ class Semigroup(libsemigroups.SemigroupNC):
                       "<class 'semigroups.semifp._FPSOME'>")
                 else PythonElementNC(g) for g in args]
         libsemigroups.SemigroupNC.__init__(self, gens)
+        self._generators = gens
+
+    def _enumerate_step(self, limit):
+        # Enumerate one more batch of self, unless it already has at least
+        # <limit> elements, and return whether it now has
+        current_size = self.current_size()
+        if not self.is_done() and current_size < limit:
+            libsemigroups.SemigroupNC.enumerate(
+                self, min(limit, current_size + self.batch_size()))
+        return self.is_done() or self.current_size() >= limit
+
+    def size_async(self):
+        '''
+        Function for finding the size of a semigroup without blocking.
+
+        The semigroup is enumerated one batch at a time by a worker thread,
+        which is shared by all asynchronous computations, and the enumeration
+        stops after the current batch if the returned future is cancelled.
+        Use ``asyncio.wrap_future`` to await the result in a coroutine.
+
+        Returns:
+            concurrent.futures.Future: A future whose result is the size
+
+        Examples:
+            >>> from semigroups import Semigroup, Transformation
+            >>> S = Semigroup(Transformation([1, 2, 0]),
+            ...               Transformation([2, 1, 0]))
+            >>> S.size_async().result()
+            6
+        '''
+        return _SCHEDULER.submit(lambda: self._enumerate_step(float('inf')),
+                                 self.size)
+
+    def enumerate_async(self, limit):
+        '''
+        Function for enumerating at least ``limit`` elements of a semigroup,
+        or all of them if there are fewer, without blocking.
+
+        The enumeration is performed as described in :meth:`size_async`.
+
+        Args:
+            limit (int):    The number of elements to enumerate
+
+        Returns:
+            concurrent.futures.Future: A future whose result is ``None``
+
+        Examples:
+            >>> from semigroups import FullTransformationMonoid
+            >>> S = FullTransformationMonoid(5)
+            >>> S.enumerate_async(100).result()
+            >>> S.current_size() >= 100
+            True
+        '''
+        return _SCHEDULER.submit(lambda: self._enumerate_step(limit),
+                                 lambda: None)
+
+    def save(self, path):
+        '''
+        Function for saving an enumerated semigroup to a file.
+
+        The semigroup is fully enumerated, and its generators are saved
+        together with the arrays returned by :meth:`elements_array` (if the
+        elements are of a type which supports it), :meth:`right_cayley_graph`
+        and :meth:`left_cayley_graph`, and the prefixes, suffixes, first and
+        final letters and lengths of the words representing the elements.
+
+        Args:
+            path (str): The name of the file
+
+        Raises:
+            TypeError:  If the elements cannot be converted to bytes (such as
+                        wrapped Python objects).
+
+        Examples:
+            >>> import os, tempfile
+            >>> from semigroups import Semigroup, FullTransformationMonoid
+            >>> path = os.path.join(tempfile.mkdtemp(), 'T4.sgp')
+            >>> FullTransformationMonoid(4).save(path)
+            >>> Semigroup.load(path).size()
+            256
+        '''
+        try:
+            generators = [binascii.hexlify(g.to_bytes()).decode('ascii')
+                          for g in self._generators]
+        except AttributeError:
+            raise TypeError('semigroups of elements of type %s cannot be '
+                            % type(self._generators[0]).__name__ + 'saved')
+        arrays = {'right_cayley_graph': self.right_cayley_graph(),
+                  'left_cayley_graph': self.left_cayley_graph()}
+        for name in _INDEX_ARRAYS:
+            arrays[name] = libsemigroups.SemigroupNC._index_array(self, name)
+        try:
+            arrays['elements'] = self.elements_array()
+        except TypeError:
+            pass
+        _save(path, type(self._generators[0]), generators, arrays)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        '''
+        Function for loading a semigroup saved by :meth:`save`.
+
+        The semigroup is created from the saved generators, but it is not
+        enumerated. Instead :meth:`size`, :meth:`is_done`, indexing,
+        iteration, :meth:`stream`, :meth:`factorisations` (of positions),
+        :meth:`elements_array`, :meth:`right_cayley_graph`, the other arrays
+        saved by :meth:`save` and Green's classes are found from the saved
+        arrays, which are read-only. The methods which look up or multiply
+        elements, such as :meth:`factorisation`, :meth:`contains_many`,
+        :meth:`products` and :meth:`idempotents`, enumerate the semigroup,
+        in the same order as when it was saved, when they are first called.
+
+        Args:
+            path (str):     The name of the file
+            mmap (bool):    Whether to memory-map the arrays, rather than to
+                            read them into memory
+
+        Returns:
+            Semigroup: The saved semigroup
+
+        Raises:
+            ValueError: If the file was not written by :meth:`save`, or by a
+                        newer version of it, or if its elements are not of
+                        a type which can be saved.
+        '''
+        element_type, generators, arrays = _load(path, mmap)
+        result = cls(*[element_type.from_bytes(binascii.unhexlify(g))
+                       for g in generators])
+        result._set_precomputed(result._generators, arrays)
+        return result
+
+
+# The names of the arrays of prefixes and so on saved by Semigroup.save
+_INDEX_ARRAYS = ('prefix', 'suffix', 'first_letter', 'final_letter', 'length')
+
+# A file written by Semigroup.save consists of _SAVE_MAGIC, the version of the
+# format and the length of the JSON metadata which follows it (packed as
+# _SAVE_HEADER), the metadata, and then the arrays, each of which starts at a
+# multiple of _SAVE_ALIGNMENT bytes. The metadata records the type of the
+# elements, their bytes (as returned by to_bytes) in hexadecimal, and the
+# dtype, shape and offset of every array.
+_SAVE_MAGIC = b'SEMIGRP\x00'
+_SAVE_VERSION = 1
+_SAVE_HEADER = struct.Struct('<8sII')
+_SAVE_ALIGNMENT = 64
+# The types of elements which can be loaded, by module and name
+_SAVE_TYPES = {(cls.__module__, cls.__name__): cls
+               for cls in (Transformation, PartialPerm, Bipartition,
+                           BooleanMat, PBR)}
+
+
+def _aligned(offset):
+    return -(-offset // _SAVE_ALIGNMENT) * _SAVE_ALIGNMENT
+
+
+def _save(path, element_type, generators, arrays):
+    offset, layout = 0, {}
+    for name in sorted(arrays):
+        array = arrays[name]
+        layout[name] = {'dtype': array.dtype.str,
+                        'shape': list(array.shape),
+                        'offset': offset}
+        offset = _aligned(offset + array.nbytes)
+    metadata = json.dumps({'type': [element_type.__module__,
+                                    element_type.__name__],
+                           'generators': generators,
+                           'arrays': layout}).encode('utf-8')
+    start = _aligned(_SAVE_HEADER.size + len(metadata))
+    with open(path, 'wb') as f:
+        f.write(_SAVE_HEADER.pack(_SAVE_MAGIC, _SAVE_VERSION, len(metadata)))
+        f.write(metadata)
+        for name in sorted(arrays):
+            f.seek(start + layout[name]['offset'])
+            numpy.ascontiguousarray(arrays[name]).tofile(f)
+        f.truncate(start + offset)
+
+
+def _load(path, mmap):
+    with open(path, 'rb') as f:
+        header = f.read(_SAVE_HEADER.size)
+        if len(header) != _SAVE_HEADER.size:
+            raise ValueError('%s is not a saved semigroup' % path)
+        magic, version, length = _SAVE_HEADER.unpack(header)
+        if magic != _SAVE_MAGIC:
+            raise ValueError('%s is not a saved semigroup' % path)
+        elif version > _SAVE_VERSION:
+            raise ValueError('%s was saved by a newer version of this package'
+                             % path)
+        metadata = json.loads(f.read(length).decode('utf-8'))
+    start = _aligned(_SAVE_HEADER.size + length)
+    element_type = _SAVE_TYPES.get(tuple(metadata['type']))
+    if element_type is None:
+        raise ValueError('%s contains elements of an unsupported type' % path)
+    arrays = {}
+    for name, layout in metadata['arrays'].items():
+        dtype, shape = numpy.dtype(layout['dtype']), tuple(layout['shape'])
+        if numpy.prod(shape) == 0:
+            array = numpy.empty(shape, dtype=dtype)
+        elif mmap:
+            array = numpy.memmap(path, dtype=dtype, mode='r', shape=shape,
+                                 offset=start + layout['offset'])
+        else:
+            with open(path, 'rb') as f:
+                f.seek(start + layout['offset'])
+                array = numpy.fromfile(f, dtype=dtype,
+                                       count=int(numpy.prod(shape)))
+            array = array.reshape(shape)
+        array.flags.writeable = False
+        arrays[name] = array
+    return element_type, metadata['generators'], arrays
+
+
+class _Scheduler(object):
+    '''
+    A worker thread which runs asynchronous computations.
+
+    Every computation is divided into steps, each of which does a bounded
+    amount of work and returns whether the computation is finished. The worker
+    runs one step of each computation in turn, so that any number of
+    computations share a single thread, and drops a computation between steps
+    if its future is cancelled. The futures remain pending until their results
+    are set, so that they can be cancelled at any time before then.
+    '''
+    def __init__(self):
+        self._jobs = collections.deque()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def submit(self, step, result):
+        '''
+        Submit a computation, which is finished when ``step()`` returns
+        ``True``, and whose result is then ``result()``.
+        '''
+        future = concurrent.futures.Future()
+        with self._condition:
+            self._jobs.append((future, step, result))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                name='semigroups-worker')
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify()
+        return future
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while len(self._jobs) == 0:
+                    self._condition.wait()
+                future, step, result = self._jobs.popleft()
+            if future.cancelled():
+                continue
+            try:
+                finished = step()
+                if finished:
+                    value = result()
+            except BaseException as e:  # pylint: disable = broad-except
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(e)
+                continue
+            if not finished:
+                with self._condition:
+                    self._jobs.append((future, step, result))
+            elif future.set_running_or_notify_cancel():
+                future.set_result(value)
+
+
+_SCHEDULER = _Scheduler()
+
 
 def FullTransformationMonoid(n):
     '''
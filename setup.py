@@ -21,7 +21,7 @@ with codecs.open(path.join(here, 'README.rst'), encoding='utf-8') as f:
     long_description = f.read()
 
 setup(
-    install_requires=['cysignals'],
+    install_requires=['cysignals', 'numpy', 'futures; python_version < "3"'],
     version='0.3.1',
     name='semigroups',
     description='Python bindings for the libsemigroups mathematics library',
@@ -53,7 +53,7 @@ setup(
                   extra_compile_args=extra_compile_args
                   )]),
 
-    tests_require=['cysignals'],
+    tests_require=['cysignals', 'numpy'],
 )
 
 # Note: getting the headers included in the source distribution seems tricky.
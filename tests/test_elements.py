@@ -1,7 +1,11 @@
 import unittest
 import sys
 import os
+import numpy
+import pickle
+import threading
 from semigroups import Bipartition, Transformation, PartialPerm, BooleanMat, PBR
+from semigroups import multiply_many, normalise_labels
 
 path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if not path in sys.path:
@@ -9,7 +13,30 @@ if not path in sys.path:
 del path
 
 
-class TestBipartition(unittest.TestCase):
+class ElementTests(object):
+    # Tests shared by all the element classes, whose test cases define
+    # hash_examples, returning elements x, y and z such that x == y != z, and
+    # pickle_examples.
+
+    def test_pickle(self):
+        for x in self.pickle_examples():
+            self.assertEqual(pickle.loads(pickle.dumps(x)), x)
+            self.assertEqual(type(x).from_bytes(x.to_bytes()), x)
+            self.assertEqual(repr(type(x).from_bytes(x.to_bytes())), repr(x))
+
+    def test_hash(self):
+        x, y, z = self.hash_examples()
+        self.assertEqual(hash(x), hash(y))
+        self.assertEqual(len({x, y, z}), 2)
+        self.assertEqual({x: 1}[y], 1)
+        # elements of other types are not equal to x, even if their hash
+        # values are the same
+        self.assertFalse(x == 1)
+        self.assertTrue(x != 'x')
+        others = [Transformation([1, 0]), PartialPerm([0], [0], 1)]
+        self.assertEqual(len({x, y, z} | set(others)), 4)
+
+class TestBipartition(ElementTests, unittest.TestCase):
     def test_init(self):
         Bipartition([-1, -2], [2, -3], [1, 3])
         Bipartition([-7, -6, -5, -4], [3, 2, 1], [-3, -2, -1, 4, 5, 6, 7])
@@ -41,13 +68,12 @@ class TestBipartition(unittest.TestCase):
         assert not Bipartition([1, -1, 3], [-3, 2, -2]) > \
                    Bipartition([1, -1], [2, 3, -2], [-3])
 
-        with self.assertRaises(TypeError):
-            PartialPerm([1, 2], [2, 1], 3) == \
-            Bipartition([1, -1], [2, 3, -2], [-3])
+        self.assertFalse(PartialPerm([1, 2], [2, 1], 3)
+                         == Bipartition([1, -1], [2, 3, -2], [-3]))
         with self.assertRaises(TypeError):
             Bipartition([1, -1], [2, -2]) < Transformation([0, 1])
-        with self.assertRaises(TypeError):
-            Bipartition([1, -1], [2, -2]) != Transformation([0, 1])
+        self.assertTrue(Bipartition([1, -1], [2, -2])
+                        != Transformation([0, 1]))
 
     def test_mul(self):
         self.assertEqual(Bipartition([1, -1, 2, -2]) * \
@@ -93,6 +119,36 @@ class TestBipartition(unittest.TestCase):
         with self.assertRaises(TypeError):
             Bipartition([1, 2], [-1], [-2]) ** 'c'
 
+    def test_multiply_many(self):
+        x = Bipartition([1, -1], [2, 3, -2], [-3])
+        y = Bipartition([1, 3, 2, -3], [-2], [-1])
+        expected = [x * y, y * x] * 100
+        results = []
+
+        def multiply():
+            results.append(multiply_many([x, y] * 100, [y, x] * 100))
+
+        # the products are computed with the GIL held, since they share
+        # scratch space in libsemigroups
+        threads = [threading.Thread(target=multiply) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [expected] * 4)
+        self.assertEqual(repr(results[0][0]), repr(x * y))
+
+    def test_imul(self):
+        x, y = Bipartition([1, -1], [2, -2]), Bipartition([1, 2], [-1, -2])
+        z = Bipartition([1, -2], [2, -1])
+        self.assertEqual(x.blocks(), [[1, -1], [2, -2]])
+        x *= y
+        self.assertEqual(repr(x), 'Bipartition([[1, 2], [-1, -2]])')
+        x.product_into(z, z)
+        self.assertEqual(x.blocks(), [[1, -1], [2, -2]])
+        multiply_many([z], [z.identity()], [x])
+        self.assertEqual(repr(x), 'Bipartition([[1, -2], [2, -1]])')
+
     def test_dealloc(self):
         A = Bipartition([1, -1, 2, -2])
         B = Bipartition([-7, -6, -5, -4], [3, 2, 1], [-3, -2, -1, 4, 5, 6, 7])
@@ -167,6 +223,17 @@ class TestBipartition(unittest.TestCase):
         with self.assertRaises(TypeError):
             Bipartition([-1, -2], [2, -3], [1, 3]).is_transverse_block([7, 26])
 
+    def pickle_examples(self):
+        return [Bipartition([1, -1], [2, 3, -2], [-3]),
+                Bipartition(*[[i, -i] for i in range(1, 200)])]
+
+    def hash_examples(self):
+        # x == y != z
+        x = Bipartition([1, -1], [2, 3, -2], [-3])
+        y = Bipartition([-3], [2, -2, 3], [-1, 1])
+        z = Bipartition([1, -1, 2, -2], [3, -3])
+        return x, y, z
+
     def test_identity(self):
         self.assertEqual(Bipartition([1, 2], [-2, -1]).identity(),
                          Bipartition([1, -1], [2, -2]))
@@ -197,7 +264,53 @@ class TestBipartition(unittest.TestCase):
                                           [-3, -2, -1, 4, 5, 6, 7])),
                          [0, 0, 0, 1, 1, 1, 1, 1, 1, 1, 2, 2, 2, 2])
 
-class TestBooleanMat(unittest.TestCase):
+    def test_init_overlapping_blocks(self):
+        with self.assertRaises(ValueError):
+            Bipartition([1, -1], [1, -2])
+        with self.assertRaises(ValueError):
+            Bipartition([1, 3], [-1, -2])
+
+    def test_from_lookup(self):
+        self.assertEqual(Bipartition.from_lookup([0, 1, 0, 2, 2, 1]),
+                         Bipartition([-1, -2], [2, -3], [1, 3]))
+        lookup = numpy.array([0, 0, 1, 1], dtype=numpy.uint8)
+        self.assertEqual(Bipartition.from_lookup(lookup),
+                         Bipartition([1, 2], [-2, -1]))
+        x = Bipartition.from_lookup([0, 0, 1, 0, 1, 2])
+        self.assertEqual(x.blocks(), [[1, 2, -1], [3, -2], [-3]])
+        self.assertEqual(x.degree(), 3)
+
+        with self.assertRaises(ValueError):
+            Bipartition.from_lookup([0, 2, 1, 0])
+        with self.assertRaises(ValueError):
+            Bipartition.from_lookup([1, 0])
+        with self.assertRaises(ValueError):
+            Bipartition.from_lookup([0, 1, 2])
+        with self.assertRaises(ValueError):
+            Bipartition.from_lookup([0, -1])
+        with self.assertRaises(ValueError):
+            Bipartition.from_lookup([])
+        with self.assertRaises(TypeError):
+            Bipartition.from_lookup([0.0, 1.0])
+
+    def test_from_labels(self):
+        self.assertEqual(Bipartition.from_labels([5, 5, 3, 5, 3, 9]),
+                         Bipartition([1, 2, -1], [3, -2], [-3]))
+        self.assertEqual(Bipartition.from_labels([-4, 10 ** 12, 10 ** 12, -4]),
+                         Bipartition([1, -2], [2, -1]))
+        self.assertEqual(Bipartition.from_labels(['a', 1, 'a', 'a']),
+                         Bipartition([1, -1, -2], [2]))
+        with self.assertRaises(ValueError):
+            Bipartition.from_labels([0, 1, 2])
+
+    def test_normalise_labels(self):
+        self.assertEqual(normalise_labels([3, 3, 0, 1, 0]).tolist(),
+                         [0, 0, 1, 2, 1])
+        self.assertEqual(normalise_labels([2.5, -1.0, 2.5]).tolist(),
+                         [0, 1, 0])
+        self.assertEqual(normalise_labels([]).tolist(), [])
+
+class TestBooleanMat(ElementTests, unittest.TestCase):
     def test_init(self):
         BooleanMat([True, True], [False, False])
         BooleanMat([False, True, True], [True, True, False],
@@ -251,9 +364,8 @@ class TestBooleanMat(unittest.TestCase):
             BooleanMat([False, False], [True, False])
         with self.assertRaises(TypeError):
             BooleanMat([False, False], [True, False]) < Transformation([0, 1])
-        with self.assertRaises(TypeError):
-            BooleanMat([True, False], [False, True]) == \
-            PartialPerm([0], [1], 2)
+        self.assertFalse(BooleanMat([True, False], [False, True])
+                         == PartialPerm([0], [1], 2))
 
     def test_mul(self):
         self.assertEqual(BooleanMat([True, False], [False, True]) * \
@@ -309,6 +421,18 @@ class TestBooleanMat(unittest.TestCase):
                        [True, True, False],
                        [False, False, False]) ** -7
 
+    def test_imul(self):
+        x, y = BooleanMat([1, 0], [1, 1]), BooleanMat([0, 1], [1, 0])
+        self.assertEqual(repr(x), 'BooleanMat([[1, 0], [1, 1]])')
+        x *= y
+        self.assertEqual(repr(x), 'BooleanMat([[0, 1], [1, 1]])')
+        self.assertEqual(x.rows(), [[False, True], [True, True]])
+        self.assertEqual(x[0], [False, True])
+        x.product_into(y, y)
+        self.assertEqual(repr(x), 'BooleanMat([[1, 0], [0, 1]])')
+        multiply_many([BooleanMat([1, 1], [0, 0])], [y], [x])
+        self.assertEqual(repr(x), 'BooleanMat([[1, 1], [0, 0]])')
+
     def test_dealloc(self):
         A = BooleanMat([True, False], [True, True])
         B = BooleanMat([False, False], [False, True])
@@ -323,6 +447,18 @@ class TestBooleanMat(unittest.TestCase):
                                     [False, False, False]).degree(), 3)
         self.assertEqual(BooleanMat([True]).degree(), 1)
 
+    def pickle_examples(self):
+        return [BooleanMat([0, 1, 1], [1, 1, 0], [0, 0, 0]),
+                BooleanMat(*[[j % (i + 1) == 0 for j in range(70)]
+                             for i in range(70)])]
+
+    def hash_examples(self):
+        # x == y != z
+        x = BooleanMat([1, 0], [1, 1])
+        y = BooleanMat([True, False], [True, True])
+        z = BooleanMat([1, 1], [1, 0])
+        return x, y, z
+
     def test_identity(self):
         self.assertEqual(BooleanMat([True, True], [False, False]).identity(),
                          BooleanMat([True, False], [False, True]))
@@ -361,7 +497,54 @@ class TestBooleanMat(unittest.TestCase):
                                     [False, True, False],
                                     [False, False, True]))
 
-class TestPartialPerm(unittest.TestCase):
+    def test_large_degree(self):
+        x = BooleanMat(*[[j == (i + 1) % 70 for j in range(70)]
+                         for i in range(70)])
+        self.assertEqual(x.degree(), 70)
+        self.assertEqual(x ** 70, x.identity())
+        self.assertEqual((x * x).rows()[0][2], True)
+        self.assertEqual(x.to_numpy().shape, (70, 70))
+        self.assertEqual(BooleanMat.from_numpy(x.to_numpy(packed=True),
+                                               packed=True), x)
+
+    def test_from_numpy(self):
+        array = numpy.array([[0, 1, 1], [1, 1, 0], [0, 0, 0]])
+        x = BooleanMat.from_numpy(array)
+        self.assertEqual(x, BooleanMat([0, 1, 1], [1, 1, 0], [0, 0, 0]))
+        self.assertEqual(x.rows(), [[False, True, True],
+                                    [True, True, False],
+                                    [False, False, False]])
+        self.assertEqual(BooleanMat.from_numpy(array.astype(bool)), x)
+        self.assertEqual(BooleanMat.from_numpy(numpy.packbits(array, axis=1),
+                                               packed=True), x)
+        # bits beyond the last column are ignored
+        self.assertEqual(BooleanMat.from_numpy(numpy.array([[255]],
+                                                           dtype=numpy.uint8),
+                                               packed=True),
+                         BooleanMat([True]))
+
+        with self.assertRaises(ValueError):
+            BooleanMat.from_numpy(numpy.array([[0, 1]]))
+        with self.assertRaises(ValueError):
+            BooleanMat.from_numpy(numpy.array([0, 1]))
+        with self.assertRaises(TypeError):
+            BooleanMat.from_numpy(numpy.array([[0, 2], [1, 1]]))
+        with self.assertRaises(ValueError):
+            BooleanMat.from_numpy(numpy.zeros((2, 2), dtype=numpy.uint8),
+                                  packed=True)
+
+    def test_to_numpy(self):
+        x = BooleanMat([0, 1, 1], [1, 1, 0], [0, 0, 0])
+        self.assertEqual(x.to_numpy().dtype, bool)
+        self.assertEqual(x.to_numpy().tolist(), x.rows())
+        self.assertEqual(x.to_numpy(packed=True).tolist(),
+                         [[96], [192], [0]])
+        x = BooleanMat(*[[j <= i for j in range(64)] for i in range(64)])
+        self.assertEqual(x.to_numpy().tolist(), x.rows())
+        self.assertEqual(x.to_numpy(packed=True)[-1].tolist(), [255] * 8)
+
+
+class TestPartialPerm(ElementTests, unittest.TestCase):
     def test_init(self):
         PartialPerm([1, 0, 2], [2, 0, 1], 3)
         PartialPerm([1, 0], [0, 1], 5)
@@ -418,13 +601,12 @@ class TestPartialPerm(unittest.TestCase):
         assert PartialPerm([1, 2, 3], [2, 1, 0], 5) <= \
                PartialPerm([1, 2, 3], [2, 1, 0], 5)
 
-        with self.assertRaises(TypeError):
-            PartialPerm([1, 2], [2, 1], 3) == \
-            Bipartition([1, -1], [2, 3, -2], [-3])
+        self.assertFalse(PartialPerm([1, 2], [2, 1], 3)
+                         == Bipartition([1, -1], [2, 3, -2], [-3]))
         with self.assertRaises(TypeError):
             PartialPerm([0, 1], [0, 1], 2) < Transformation([0, 1])
-        with self.assertRaises(TypeError):
-            PartialPerm([0, 1], [0, 1], 2) != Transformation([0, 1])
+        self.assertTrue(PartialPerm([0, 1], [0, 1], 2)
+                        != Transformation([0, 1]))
 
     def test_mul(self):
         self.assertEqual(PartialPerm([0, 1], [0, 1], 2) * \
@@ -475,6 +657,84 @@ class TestPartialPerm(unittest.TestCase):
         with self.assertRaises(TypeError):
             PartialPerm([1, 2], [0, 1], 3).rank(2)
 
+    def test_large_degree(self):
+        x = PartialPerm([0, 65535, 70000], [65535, 1, 0], 70001)
+        self.assertEqual(x.as_array().dtype, numpy.uint32)
+        self.assertEqual(x.domain(), [0, 65535, 70000])
+        self.assertEqual(x.range(), [65535, 1, 0])
+        self.assertEqual(eval(repr(x)), x)
+        self.assertEqual(x.rank(), 3)
+        self.assertEqual(x * x, PartialPerm([0, 70000], [1, 65535], 70001))
+        self.assertEqual(PartialPerm([0], [1], 300).as_array().dtype,
+                         numpy.uint16)
+        self.assertEqual(PartialPerm([0], [1], 300).as_array()[1], 65535)
+
+    def test_iter(self):
+        # the undefined images are 65535, whatever the width of the images
+        x = PartialPerm([1, 4, 2], [2, 3, 4], 6)
+        self.assertEqual(list(x), [65535, 2, 4, 65535, 3, 65535])
+        self.assertEqual(list(PartialPerm([0], [299], 300))[:2], [299, 65535])
+        self.assertEqual(list(PartialPerm([0], [1], 70000))[:2],
+                         [1, 4294967295])
+        self.assertEqual(PartialPerm.from_images(list(x)), x)
+        y = PartialPerm([0, 65535], [65535, 1], 70000)
+        self.assertEqual(PartialPerm.from_images(list(y)), y)
+
+    def test_init_widths(self):
+        # lists are converted without numpy, in the same way as arrays
+        for n in (255, 256, 65535, 65536):
+            x = PartialPerm([0, n - 1], [n - 1, 1], n)
+            images = [-1] * n
+            images[0], images[n - 1] = n - 1, 1
+            y = PartialPerm.from_images(numpy.array(images))
+            self.assertEqual(x, y)
+            self.assertEqual(x.as_array().tolist(), y.as_array().tolist())
+        x = Transformation([1, 0] + list(range(2, 300)))
+        self.assertEqual(x.as_array().dtype, numpy.uint16)
+        self.assertEqual(x * x, Transformation(list(range(300))))
+
+    def test_from_images(self):
+        self.assertEqual(PartialPerm.from_images([-1, 2, 4, -1, 3, -1]),
+                         PartialPerm([1, 4, 2], [2, 3, 4], 6))
+        x = PartialPerm([1, 4, 2], [2, 3, 4], 6)
+        self.assertEqual(PartialPerm.from_images(x.as_array()), x)
+        self.assertEqual(PartialPerm.from_images(numpy.array([1, 0]),
+                                                 check=False),
+                         PartialPerm([0, 1], [1, 0], 2))
+        self.assertEqual(PartialPerm.from_images([2, -1, 0]).domain(),
+                         [0, 2])
+
+        with self.assertRaises(ValueError):
+            PartialPerm.from_images([1, 1, -1])
+        with self.assertRaises(ValueError):
+            PartialPerm.from_images([0, 3, -1])
+        with self.assertRaises(ValueError):
+            PartialPerm.from_images([0, -2])
+        with self.assertRaises(TypeError):
+            PartialPerm.from_images([0.0, 1.0])
+
+    def test_from_2d_array(self):
+        self.assertEqual(PartialPerm.from_2d_array(numpy.array([[1, -1],
+                                                                [-1, 0]])),
+                         [PartialPerm([0], [1], 2), PartialPerm([1], [0], 2)])
+        self.assertEqual(PartialPerm.from_2d_array(numpy.zeros((0, 3))), [])
+
+        with self.assertRaises(ValueError):
+            PartialPerm.from_2d_array([[1, -1], [0, 0]])
+        with self.assertRaises(ValueError):
+            PartialPerm.from_2d_array([1, -1])
+
+    def test_as_array(self):
+        x = PartialPerm([1, 4, 2], [2, 3, 4], 6)
+        arr = x.as_array()
+        self.assertEqual(arr.dtype, numpy.uint8)
+        self.assertEqual(arr.tolist(), [255, 2, 4, 255, 3, 255])
+        self.assertEqual(numpy.asarray(x).tolist(), arr.tolist())
+        self.assertEqual(PartialPerm([], [], 0).as_array().tolist(), [])
+
+        with self.assertRaises(ValueError):
+            arr[0] = 1
+
     def test_domain(self):
         self.assertEqual(set(PartialPerm([1, 4, 2], [2, 3, 4], 6).domain()),
                          set([1, 4, 2]))
@@ -503,12 +763,85 @@ class TestPartialPerm(unittest.TestCase):
         with self.assertRaises(TypeError):
             PartialPerm([1, 2], [0, 1], 3).degree(8.5)
 
+    def test_imul(self):
+        x = PartialPerm([0, 1], [1, 2], 3)
+        y = PartialPerm([1, 2], [0, 1], 3)
+        self.assertEqual(x.domain(), [0, 1])
+        x *= y
+        self.assertEqual(repr(x), 'PartialPerm([0, 1], [0, 1], 3)')
+        x.product_into(y, y)
+        self.assertEqual((x.domain(), x.range()), ([2], [0]))
+        multiply_many([PartialPerm([0, 1], [1, 2], 3)],
+                      [PartialPerm([0, 1], [1, 2], 3)], [x])
+        self.assertEqual(repr(x), 'PartialPerm([0], [2], 3)')
+
     def test_dealloc(self):
         t = PartialPerm([0, 1], [1, 0], 2)
         del t
         with self.assertRaises(NameError):
             t
 
+    def test_domain_range_array(self):
+        x = PartialPerm([1, 2, 5], [3, 2, 0], 6)
+        self.assertEqual(x.domain_array().tolist(), [1, 2, 5])
+        self.assertEqual(x.range_array().tolist(), [3, 2, 0])
+        x = PartialPerm([299, 0], [1, 300], 301)
+        self.assertEqual(x.domain_array().tolist(), [0, 299])
+        self.assertEqual(x.domain_array().dtype, x.range_array().dtype)
+        self.assertEqual(x.domain_array().dtype, numpy.uint16)
+        self.assertEqual(x.range_array().tolist(), [300, 1])
+        self.assertEqual(x.domain(), [0, 299])
+        self.assertEqual(x.range(), [300, 1])
+        x = PartialPerm([], [], 3)
+        self.assertEqual(x.domain_array().tolist(), [])
+        self.assertEqual(x.range_array().tolist(), [])
+
+    def test_inverse(self):
+        x = PartialPerm([1, 2, 5], [3, 2, 0], 6)
+        self.assertEqual(x.inverse(), PartialPerm([3, 2, 0], [1, 2, 5], 6))
+        self.assertEqual(x * x.inverse() * x, x)
+        self.assertEqual(x.inverse().inverse(), x)
+        x = PartialPerm(list(range(500)), list(range(1, 501)), 501)
+        self.assertEqual(x.inverse() * x,
+                         PartialPerm(list(range(1, 501)),
+                                     list(range(1, 501)), 501))
+        self.assertEqual(PartialPerm([], [], 0).inverse(),
+                         PartialPerm([], [], 0))
+
+    def test_restrict(self):
+        x = PartialPerm([1, 2, 5], [3, 2, 0], 6)
+        self.assertEqual(x.restrict({0, 2, 5}),
+                         PartialPerm([2, 5], [2, 0], 6))
+        self.assertEqual(x.restrict([]), PartialPerm([], [], 6))
+        self.assertEqual(x.restrict(range(6)), x)
+        with self.assertRaises(ValueError):
+            x.restrict([6])
+        with self.assertRaises(ValueError):
+            x.restrict([-1])
+
+    def test_natural_leq(self):
+        x = PartialPerm([1, 2, 5], [3, 2, 0], 6)
+        self.assertTrue(x.natural_leq(x))
+        self.assertTrue(x.restrict([1, 5]).natural_leq(x))
+        self.assertFalse(x.natural_leq(x.restrict([1, 5])))
+        self.assertFalse(PartialPerm([1], [2], 6).natural_leq(x))
+        self.assertTrue(PartialPerm([], [], 6).natural_leq(x))
+        with self.assertRaises(ValueError):
+            x.natural_leq(PartialPerm([1], [2], 3))
+        with self.assertRaises(TypeError):
+            x.natural_leq(Transformation([0, 1, 2, 3, 4, 5]))
+
+    def pickle_examples(self):
+        return [PartialPerm([0, 2], [1, 0], 3),
+                PartialPerm(list(range(300)), list(range(1, 301)), 400)]
+
+    def hash_examples(self):
+        # x == y != z
+        x = PartialPerm([0, 2], [1, 0], 3)
+        y = PartialPerm([2, 0], [0, 1], 3)
+        z = PartialPerm([0, 1], [1, 0], 3)
+        return x, y, z
+
     def test_identity(self):
         self.assertEqual(PartialPerm([0, 1], [1, 0], 2).identity(),
                          PartialPerm([0, 1], [0, 1], 2))
@@ -528,7 +861,7 @@ class TestPartialPerm(unittest.TestCase):
         self.assertEqual(eval(PartialPerm([1, 2, 3], [2, 1, 0], 5).__repr__()),
                          PartialPerm([1, 2, 3], [2, 1, 0], 5))
 
-class TestPBR(unittest.TestCase):
+class TestPBR(ElementTests, unittest.TestCase):
     def test_init(self):
         PBR([[1, -1]], [[1]])
         PBR([[1, -1], [-2, -1]], [[1], [-2, -1]])
@@ -572,15 +905,13 @@ class TestPBR(unittest.TestCase):
         self.assertTrue(PBR([[1, -1], [-2, -1, 2]], [[2], [-2]])
                         <= PBR([[1, -1], [-2, -1, 2]], [[2], [-2]]))
 
-        with self.assertRaises(TypeError):
-            (PBR([[1, -1, 3], [-2, -1, 2], [3, -2]],
-                 [[2], [-2], [1, -1, 2]]) ==
-             Bipartition([1, -1], [2, 3, -2], [-3]))
+        self.assertFalse(PBR([[1, -1, 3], [-2, -1, 2], [3, -2]],
+                             [[2], [-2], [1, -1, 2]]) ==
+                         Bipartition([1, -1], [2, 3, -2], [-3]))
         with self.assertRaises(TypeError):
             PBR([[1, -1], [-2, -1]], [[1], [-2, -1]]) < Transformation([0, 1])
-        with self.assertRaises(TypeError):
-            PBR([[1, -1], [-2, -1]], [[1], [-2, -1]]) != \
-            PartialPerm([0, 1], [1, 0], 2)
+        self.assertTrue(PBR([[1, -1], [-2, -1]], [[1], [-2, -1]])
+                        != PartialPerm([0, 1], [1, 0], 2))
         with self.assertRaises(TypeError):
             PBR([[1, -1]], [[1]]) < 3
 
@@ -640,6 +971,23 @@ class TestPBR(unittest.TestCase):
         with self.assertRaises(TypeError):
             PBR([[1, -1]], [[1]]) ** 'a'
 
+    def test_imul(self):
+        x, y = PBR([[1, -1]], [[1]]), PBR([[]], [[]])
+        before = repr(x)
+        expected = x * y
+        self.assertNotEqual(expected, x)
+        x *= y
+        self.assertNotEqual(repr(x), before)
+        self.assertEqual(repr(x), repr(expected))
+        x = PBR([[1, -1]], [[1]])
+        repr(x)
+        x.product_into(x, y)
+        self.assertEqual(repr(x), repr(expected))
+        x = PBR([[1, -1]], [[1]])
+        repr(x)
+        multiply_many([PBR([[1, -1]], [[1]])], [y], [x])
+        self.assertEqual(repr(x), repr(expected))
+
     def test_dealloc(self):
         A = PBR([[1, -1]], [[1]]),
         B = PBR([[1, -1, 3], [-2, -1, 2], [3, -2]], [[2], [-2], [1, -1, 2]])
@@ -654,6 +1002,17 @@ class TestPBR(unittest.TestCase):
                               [[2], [3, -2, -3], [1, 2, 3, -2, -3]]).degree(), 3)
         self.assertEqual(PBR([[1, -1], [-2, -1, 2]], [[2], [-2]]).degree(), 2)
 
+    def pickle_examples(self):
+        return [PBR([[1, -1], [-2, -1, 2]], [[2], [-2]]),
+                PBR([[]], [[]])]
+
+    def hash_examples(self):
+        # x == y != z
+        x = PBR([[1, -1], [-2, -1]], [[1], [-2, -1]])
+        y = PBR([[1, -1], [-2, -1]], [[1], [-2, -1]])
+        z = PBR([[1, -1], [-2, -1, 2]], [[2], [-2]])
+        return x, y, z
+
     def test_identity(self):
         self.assertEqual(PBR([[-1, 1, 2], [2]], [[-1, 1], [-2, 2]]).identity(),
                          PBR([[-1], [-2]], [[1], [2]]))
@@ -676,7 +1035,7 @@ class TestPBR(unittest.TestCase):
                               [[2], [3, -2, -3], [1, 2, 3, -2, -3]]))
         self.assertEqual(eval(PBR([[1, -1]], [[1]]).__repr__()), PBR([[1, -1]], [[1]]))
 
-class TestTransformation(unittest.TestCase):
+class TestTransformation(ElementTests, unittest.TestCase):
     def test_init(self):
         Transformation([0, 1, 2, 3])
         Transformation([1, 1, 3, 2, 4, 3])
@@ -707,12 +1066,12 @@ class TestTransformation(unittest.TestCase):
         assert Transformation([2, 2, 2]) >= Transformation([2, 2, 0])
         assert Transformation([3, 2, 3, 0]) >= Transformation([3, 2, 0, 1])
 
-        with self.assertRaises(TypeError):
-            Transformation([2, 2, 0]) == Bipartition([1, -1], [2, 3, -2], [-3])
+        self.assertFalse(Transformation([2, 2, 0])
+                         == Bipartition([1, -1], [2, 3, -2], [-3]))
         with self.assertRaises(TypeError):
             Bipartition([1, -1], [2, -2]) < Transformation([0, 1])
-        with self.assertRaises(TypeError):
-            Bipartition([1, -1], [2, -2]) != Transformation([0, 1])
+        self.assertTrue(Bipartition([1, -1], [2, -2])
+                        != Transformation([0, 1]))
 
     def test_mul(self):
         self.assertEqual(Transformation([1, 3, 2, 1]) * \
@@ -744,6 +1103,18 @@ class TestTransformation(unittest.TestCase):
         self.assertEqual(Transformation([1, 1, 3, 2, 4, 3]) ** 0,
                          Transformation([1, 1, 3, 2, 4, 3]).identity())
 
+        x = Transformation([9, 3, 1, 2, 0, 8, 1, 2, 0, 5])
+        y = x.identity()
+        for i in range(40):
+            y = y * x
+        self.assertEqual(x ** 40, y)
+        self.assertEqual(Transformation([1, 2, 0, 0]) ** (10 ** 18),
+                         Transformation([1, 2, 0, 0]))
+        self.assertEqual(Transformation([1, 2, 0, 0]) ** (10 ** 30 + 2),
+                         Transformation([0, 1, 2, 2]))
+        self.assertEqual(Transformation([0]) ** (10 ** 18),
+                         Transformation([0]))
+
         with self.assertRaises(ValueError):
             Transformation([1, 2, 3, 0]) ** -1
         with self.assertRaises(TypeError):
@@ -751,6 +1122,53 @@ class TestTransformation(unittest.TestCase):
         with self.assertRaises(TypeError):
             Transformation([3, 2, 0, 0]) ** 'l'
 
+    def test_imul(self):
+        x, y = Transformation([1, 3, 2, 1]), Transformation([0, 3, 2, 2])
+        z = x
+        x *= y
+        self.assertIs(x, z)
+        self.assertEqual(x, Transformation([3, 2, 2, 3]))
+        x *= x
+        self.assertEqual(x, Transformation([3, 2, 2, 3]))
+
+        with self.assertRaises(TypeError):
+            x *= PartialPerm([0, 1], [1, 2], 4)
+        with self.assertRaises(ValueError):
+            x *= Transformation([0, 1])
+
+        # *= changes the element itself, not only the name
+        w = x
+        x *= y
+        self.assertIs(w, x)
+        self.assertEqual(w, Transformation([2, 2, 2, 2]))
+        for i in range(3):
+            x *= x
+        self.assertEqual(x, Transformation([2, 2, 2, 2]))
+
+        array = x.as_array()
+        with self.assertRaises(BufferError):
+            x *= y
+        with self.assertRaises(BufferError):
+            x.product_into(y, y)
+        del array
+        x.product_into(y, y)
+        self.assertEqual(x, y * y)
+
+    def test_product_into(self):
+        x, y = Transformation([1, 3, 2, 1]), Transformation([0, 3, 2, 2])
+        z = x.identity()
+        self.assertIsNone(z.product_into(x, y))
+        self.assertEqual(z, x * y)
+        z.product_into(z, y)
+        self.assertEqual(z, x * y * y)
+        y.product_into(x, y)
+        self.assertEqual(y, Transformation([3, 2, 2, 3]))
+
+        with self.assertRaises(TypeError):
+            z.product_into(x, PartialPerm([0, 1], [1, 2], 4))
+        with self.assertRaises(ValueError):
+            z.product_into(Transformation([0, 1]), Transformation([0, 1]))
+
     def test_dealloc(self):
         U, V = Transformation([1, 0, 1, 2]), Transformation([1, 1, 3, 2, 4, 3])
         del U, V
@@ -759,6 +1177,42 @@ class TestTransformation(unittest.TestCase):
         with self.assertRaises(NameError):
             U
 
+    def pickle_examples(self):
+        return [Transformation([1, 0, 1]),
+                Transformation(list(range(1, 70000)) + [0])]
+
+    def test_from_bytes_fail(self):
+        x = Transformation([1, 0, 1])
+        with self.assertRaises(ValueError):
+            Transformation.from_bytes(PartialPerm([0], [1], 2).to_bytes())
+        with self.assertRaises(ValueError):
+            Transformation.from_bytes(x.to_bytes()[:-1])
+        with self.assertRaises(ValueError):
+            Transformation.from_bytes(b'')
+
+    def hash_examples(self):
+        # x == y != z
+        x = Transformation([1, 0, 1])
+        y = Transformation([1, 0, 1])
+        z = Transformation([0, 0, 1])
+        return x, y, z
+
+    def test_hash_changed(self):
+        x, z = Transformation([1, 0, 1]), Transformation([0, 0, 1])
+        # the cached hash value is reset when an element is changed
+        x *= z
+        self.assertEqual(hash(x), hash(Transformation([0, 0, 0])))
+
+    def test_hash_mixed_types(self):
+        # a transformation and a partial perm with the same images have the
+        # same hash value, but they are not equal
+        x = Transformation([1, 0, 2])
+        y = PartialPerm([0, 1, 2], [1, 0, 2], 3)
+        self.assertNotEqual(x, y)
+        self.assertEqual({x: 1, y: 2}[x], 1)
+        self.assertEqual({x: 1, y: 2}[y], 2)
+        self.assertEqual(len({x, y, Transformation([1, 0, 2])}), 2)
+
     def test_identity(self):
         self.assertEqual(Transformation([9, 3, 1, 2, 0,
                                          8, 1, 2, 0, 5]).identity(),
@@ -768,6 +1222,87 @@ class TestTransformation(unittest.TestCase):
         self.assertEqual(Transformation([1, 2, 3, 3]).identity(),
                          Transformation([0, 1, 2, 3]))
 
+    def test_multiply_many(self):
+        x, y = Transformation([1, 3, 2, 1]), Transformation([0, 3, 2, 2])
+        self.assertEqual(multiply_many([x, y, x], [y, x, x]),
+                         [x * y, y * x, x * x])
+        self.assertEqual(multiply_many([], []), [])
+        self.assertEqual(x.multiply_all([x, y]), [x * x, x * y])
+
+        out = [x.identity(), x.identity()]
+        self.assertIs(multiply_many([x, y], [y, y], out), out)
+        self.assertEqual(out, [x * y, y * y])
+
+        with self.assertRaises(TypeError):
+            multiply_many([x], [PartialPerm([0, 1], [1, 2], 4)])
+        with self.assertRaises(ValueError):
+            multiply_many([x], [Transformation([0, 1])])
+        with self.assertRaises(ValueError):
+            multiply_many([x, y], [y])
+        with self.assertRaises(ValueError):
+            multiply_many([x], [y], [x])
+
+    def test_large_degree(self):
+        x = Transformation([1, 0] + list(range(2, 70000)))
+        self.assertEqual(x.degree(), 70000)
+        self.assertEqual(x.as_array().dtype, numpy.uint32)
+        self.assertEqual(list(x)[:3], [1, 0, 2])
+        self.assertEqual(x * x, x.identity())
+        self.assertEqual(x ** 70001, x)
+        self.assertEqual(Transformation(list(range(256))).as_array().dtype,
+                         numpy.uint16)
+        self.assertEqual(Transformation(list(range(255))).as_array().dtype,
+                         numpy.uint8)
+
+    def test_from_array(self):
+        self.assertEqual(Transformation.from_array(numpy.array([1, 0, 1])),
+                         Transformation([1, 0, 1]))
+        self.assertEqual(Transformation.from_array([2, 2, 2], check=False),
+                         Transformation([2, 2, 2]))
+        x = Transformation([9, 3, 1, 2, 0, 8, 1, 2, 0, 5])
+        self.assertEqual(Transformation.from_array(x.as_array()), x)
+        self.assertIsInstance(Transformation.from_array([0]), Transformation)
+
+        with self.assertRaises(ValueError):
+            Transformation.from_array([1, 5, 26])
+        with self.assertRaises(ValueError):
+            Transformation.from_array([0, -1])
+        with self.assertRaises(TypeError):
+            Transformation.from_array([0.1, 1.0])
+
+    def test_from_2d_array(self):
+        array = numpy.array([[1, 0, 1], [2, 2, 2], [0, 1, 2]])
+        self.assertEqual(Transformation.from_2d_array(array),
+                         [Transformation([1, 0, 1]), Transformation([2, 2, 2]),
+                          Transformation([0, 1, 2])])
+        self.assertEqual(Transformation.from_2d_array(array, check=False),
+                         Transformation.from_2d_array(array))
+        self.assertEqual(Transformation.from_2d_array(numpy.zeros((0, 4),
+                                                                  int)), [])
+
+        with self.assertRaises(ValueError):
+            Transformation.from_2d_array([[1, 0, 1], [2, 2, 3]])
+        with self.assertRaises(ValueError):
+            Transformation.from_2d_array([1, 0, 1])
+
+    def test_as_array(self):
+        x = Transformation([9, 3, 1, 2, 0, 8, 1, 2, 0, 5])
+        arr = x.as_array()
+        self.assertEqual(arr.dtype, numpy.uint8)
+        self.assertEqual(arr.tolist(), [9, 3, 1, 2, 0, 8, 1, 2, 0, 5])
+        self.assertEqual(memoryview(x).tolist(), list(x))
+        view = memoryview(Transformation(list(range(300))))
+        self.assertEqual((view.itemsize, view.shape, view.strides),
+                         (2, (300,), (2,)))
+        self.assertTrue(view.c_contiguous)
+        view.release()
+
+        with self.assertRaises(ValueError):
+            arr[0] = 1
+
+        del x
+        self.assertEqual(arr.tolist(), [9, 3, 1, 2, 0, 8, 1, 2, 0, 5])
+
     def test_degree(self):
         self.assertEqual(Transformation([9, 3, 1, 2, 0,
                                          8, 1, 2, 0, 5]).degree(), 10)
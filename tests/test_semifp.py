@@ -89,6 +89,26 @@ class TestFpSemigroup(unittest.TestCase):
         S = FpSemigroup("ab", [])
         self.assertEqual(S.size(), float("inf"))
 
+    def test_size_async(self):
+        S = FpSemigroup("ab", [["a", "aa"], ["b", "bb"], ["ab", "ba"]])
+        self.assertEqual(S.size_async().result(), 3)
+        S = FpSemigroup("ab", [])
+        self.assertEqual(S.size_async().result(), float("inf"))
+
+    def test_size_async_same_semigroup(self):
+        S = FpSemigroup("ab", [["a^10", "a"], ["bbb", "b"], ["ba", "ab"]])
+        futures = [S.size_async() for i in range(4)]
+        self.assertEqual(S.size(), 29)
+        self.assertEqual([future.result() for future in futures], [29] * 4)
+
+    def test_enumerate_async(self):
+        S = FpSemigroup("ab", [["a", "aa"], ["b", "bb"], ["ab", "ba"]])
+        self.assertIsNone(S.enumerate_async(2).result())
+        self.assertTrue(S.current_size() >= 2)
+        S = FpSemigroup("ab", [])
+        with self.assertRaises(ValueError):
+            S.enumerate_async(10)
+
     def test_normal_form(self):
         S = FpSemigroup("a", [["a", "aa"]])
         self.assertEqual(S.normal_form("a^1000"), "a")
@@ -281,6 +301,28 @@ class Test_FPSOME(unittest.TestCase):
         with self.assertRaises(TypeError):
             FpSemigroup("a", [["aa", "a"]])[0].get_value() * a
 
+    def test_imul_pow(self):
+        FpS = FpSemigroup("ab", [["aa", "a"], ["bbb", "b"], ["ba", "ab"]])
+        a = FpS[1].get_value()
+        b = a
+        b *= a
+        self.assertIsNot(b, a)
+        self.assertEqual(b.word, a.word * 2)
+        self.assertEqual((a ** 3).word, a.word * 3)
+        self.assertEqual((a ** 0).word, "")
+
+    def test_copy_to_bytes(self):
+        FpS = FpSemigroup("ab", [["aa", "a"], ["bbb", "b"], ["ba", "ab"]])
+        a = FpS[1].get_value()
+        b = a.copy()
+        self.assertIsNot(b, a)
+        self.assertEqual(b.word, a.word)
+        self.assertIs(b.FpS, FpS)
+        with self.assertRaises(TypeError):
+            a.to_bytes()
+        with self.assertRaises(TypeError):
+            b.product_into(a, a)
+
     def test_repr(self):
         FpS = FpSemigroup("ab", [["aa", "a"], ["bbb", "b"], ["ab", "ba"]])
         self.assertEqual(FpS[0].__repr__(), "'" + FpS[0].get_value().Repword + "'")
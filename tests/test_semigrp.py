@@ -1 +1,438 @@
-# TODO add tests!
+# pylint: disable = C0103,E0611,C0111,W0104,R0201
+import unittest
+import sys
+import os
+import tempfile
+import threading
+import numpy
+from semigroups import Semigroup, FullTransformationMonoid, Transformation
+from semigroups import PartialPerm, Bipartition, BooleanMat, PBR
+from semigroups import set_default_max_threads, default_max_threads
+from semigroups import normalise_labels
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if path not in sys.path:
+    sys.path.insert(1, path)
+del path
+
+
+class TestSemigroup(unittest.TestCase):
+    def test_views(self):
+        S = FullTransformationMonoid(4)
+        x = S[3]
+        self.assertEqual(x, S[3])
+        elements = list(S)
+        self.assertEqual(len(elements), 256)
+        self.assertEqual(elements[3], x)
+        del S
+        # the views keep the semigroup alive
+        self.assertEqual(x * elements[3], elements[3] * x)
+
+    def test_views_copy_on_write(self):
+        S = Semigroup(Transformation([1, 2, 0]), Transformation([1, 0, 2]))
+        x, y = S[0], S[0]
+        x *= S[1]
+        self.assertEqual(x, Transformation([0, 2, 1]))
+        self.assertEqual(y, Transformation([1, 2, 0]))
+        self.assertEqual(S[0], Transformation([1, 2, 0]))
+
+        y.product_into(S[1], S[1])
+        self.assertEqual(y, Transformation([0, 1, 2]))
+        self.assertEqual(S[0], Transformation([1, 2, 0]))
+
+        z = S[0].copy()
+        z *= z
+        self.assertEqual(z, Transformation([2, 0, 1]))
+        self.assertEqual(S[0], Transformation([1, 2, 0]))
+
+    def test_size(self):
+        self.assertEqual(FullTransformationMonoid(5).size(), 3125)
+        self.assertEqual(Semigroup([1j]).size(), 4)
+
+    def test_size_threads(self):
+        semigroups = [FullTransformationMonoid(5) for i in range(4)]
+        # the same semigroup is enumerated from two threads at once
+        semigroups.append(semigroups[0])
+        threads = [threading.Thread(target=S.size) for S in semigroups]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(all(S.is_done() for S in semigroups))
+        self.assertEqual([S.size() for S in semigroups], [3125] * 5)
+
+    def test_size_threads_bipartitions(self):
+        gens = [Bipartition([1, -1], [2, -2], [3, -3]),
+                Bipartition([1, -2], [2, -3], [3, -1]),
+                Bipartition([1, 2, -3], [3, -1, -2])]
+        semigroups = [Semigroup(gens) for i in range(4)]
+        threads = [threading.Thread(target=S.size) for S in semigroups]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        sizes = [S.size() for S in semigroups]
+        self.assertEqual(sizes, [Semigroup(gens).size()] * 4)
+
+    def test_enumerate(self):
+        S = FullTransformationMonoid(6)
+        S.enumerate(100)
+        self.assertTrue(len(list(S)) >= 100)
+        S.enumerate(10 ** 6)
+        self.assertTrue(S.is_done())
+
+    def test_size_async(self):
+        futures = [FullTransformationMonoid(n).size_async()
+                   for n in range(1, 6)]
+        self.assertEqual([f.result() for f in futures],
+                         [1, 4, 27, 256, 3125])
+        self.assertEqual(Semigroup([1j]).size_async().result(), 4)
+
+    def test_enumerate_async(self):
+        S = FullTransformationMonoid(6)
+        self.assertIsNone(S.enumerate_async(1000).result())
+        self.assertTrue(S.current_size() >= 1000)
+
+    def test_cancel(self):
+        S = FullTransformationMonoid(8)
+        future = S.size_async()
+        self.assertTrue(future.cancel())
+        self.assertTrue(future.cancelled())
+        # the worker is still available after a cancellation
+        self.assertEqual(FullTransformationMonoid(3).size_async().result(),
+                         27)
+        self.assertFalse(S.is_done())
+
+    def test_stream(self):
+        S = FullTransformationMonoid(4)
+        batches = list(S.stream(100))
+        self.assertEqual([len(batch) for batch in batches], [100, 100, 56])
+        self.assertEqual([x for batch in batches for x in batch], list(S))
+        positions = list(S.stream(100, positions=True))
+        self.assertEqual([p.tolist() for p in positions],
+                         [list(range(0, 100)), list(range(100, 200)),
+                          list(range(200, 256))])
+        with self.assertRaises(ValueError):
+            next(S.stream(0))
+
+    def test_stream_lazy(self):
+        S = FullTransformationMonoid(8)
+        stream = S.stream(10)
+        self.assertEqual(len(next(stream)), 10)
+        self.assertEqual(len(next(stream)), 10)
+        self.assertFalse(S.is_done())
+
+    def test_set_max_threads(self):
+        S = FullTransformationMonoid(5)
+        S.set_max_threads(2)
+        self.assertEqual(S.nridempotents(), 196)
+        Semigroup([1j]).set_max_threads(4)
+        with self.assertRaises(ValueError):
+            S.set_max_threads(0)
+        with self.assertRaises(TypeError):
+            S.set_max_threads('a')
+
+    def test_default_max_threads(self):
+        self.assertIsNone(default_max_threads())
+        set_default_max_threads(2)
+        try:
+            self.assertEqual(default_max_threads(), 2)
+            self.assertEqual(FullTransformationMonoid(4).nridempotents(), 41)
+        finally:
+            set_default_max_threads(None)
+        self.assertIsNone(default_max_threads())
+        with self.assertRaises(ValueError):
+            set_default_max_threads(-1)
+
+    def test_elements_array(self):
+        S = FullTransformationMonoid(4)
+        array = S.elements_array()
+        self.assertEqual(array.shape, (256, 4))
+        self.assertEqual(array.dtype, numpy.uint8)
+        self.assertEqual(array.tolist(), [list(x) for x in S])
+
+        S = Semigroup(PartialPerm([0, 1], [1, 2], 3),
+                      PartialPerm([0, 1, 2], [1, 0, 2], 3))
+        self.assertEqual(S.elements_array().tolist(),
+                         [x.as_array().tolist() for x in S])
+
+        S = Semigroup(Bipartition([1, -1], [2, -2], [3, -3]),
+                      Bipartition([1, 2], [3, -3], [-1, -2]))
+        self.assertEqual(S.elements_array().tolist(), [list(x) for x in S])
+
+        S = Semigroup(BooleanMat([0, 1], [1, 0]), BooleanMat([1, 1], [0, 1]))
+        self.assertEqual(S.elements_array().tolist(),
+                         [x.to_numpy(packed=True).tolist() for x in S])
+
+        with self.assertRaises(TypeError):
+            Semigroup([1j]).elements_array()
+
+    def test_cayley_graphs(self):
+        S = FullTransformationMonoid(4)
+        gens = [S[i] for i in range(S.nrgens())]
+        elements = list(S)
+        right, left = S.right_cayley_graph(), S.left_cayley_graph()
+        self.assertEqual(right.shape, (256, 3))
+        self.assertEqual(right.dtype, numpy.uint32)
+        self.assertEqual(left.shape, (256, 3))
+        for i, x in enumerate(elements):
+            for j, g in enumerate(gens):
+                self.assertEqual(elements[right[i, j]], x * g)
+                self.assertEqual(elements[left[i, j]], g * x)
+
+    def test_save_load(self):
+        path = os.path.join(tempfile.mkdtemp(), 'T4.sgp')
+        S = FullTransformationMonoid(4)
+        S.save(path)
+        for mmap in (True, False):
+            T = Semigroup.load(path, mmap=mmap)
+            self.assertTrue(T.is_done())
+            self.assertEqual(T.current_size(), 256)
+            self.assertEqual(T.size(), 256)
+            self.assertEqual(T.elements_array().tolist(),
+                             S.elements_array().tolist())
+            self.assertEqual(T.right_cayley_graph().tolist(),
+                             S.right_cayley_graph().tolist())
+            self.assertEqual(T.left_cayley_graph().tolist(),
+                             S.left_cayley_graph().tolist())
+            self.assertEqual(T.right_cayley_graph().dtype, numpy.uint32)
+            self.assertEqual(T[5], S[5])
+            self.assertIsNone(T[256])
+            self.assertEqual(list(T), list(S))
+            self.assertEqual([len(batch) for batch in T.stream(100)],
+                             [100, 100, 56])
+            for words, expected in ((T.factorisations(), S.factorisations()),
+                                    (T.factorisations([100, 7]),
+                                     S.factorisations([100, 7]))):
+                self.assertEqual([a.tolist() for a in words],
+                                 [a.tolist() for a in expected])
+            # none of the above enumerates the semigroup
+            self.assertTrue(T.current_max_word_length()
+                            < S.current_max_word_length())
+            self.assertEqual(T.factorisation(T[100]), S.factorisation(S[100]))
+
+        path = os.path.join(tempfile.mkdtemp(), 'pbr.sgp')
+        S = Semigroup(PBR([[1, -1]], [[1]]), PBR([[-1]], [[]]))
+        S.save(path)
+        self.assertEqual(Semigroup.load(path).size(), S.size())
+        with self.assertRaises(TypeError):
+            Semigroup.load(path).elements_array()
+
+        path = os.path.join(tempfile.mkdtemp(), 'T2.sgp')
+        FullTransformationMonoid(2).save(path)
+        with open(path, 'rb') as f:
+            data = f.read()
+        # only the types of elements defined in this package can be loaded
+        with open(path, 'wb') as f:
+            f.write(data.replace(b'"Transformation"', b'"ArbitraryClass"'))
+        with self.assertRaises(ValueError):
+            Semigroup.load(path)
+
+        with self.assertRaises(TypeError):
+            Semigroup([1j]).save(path)
+        with open(path, 'wb') as f:
+            f.write(b'not a semigroup')
+        with self.assertRaises(ValueError):
+            Semigroup.load(path)
+
+    def test_contains_many(self):
+        S = Semigroup(Transformation([1, 0, 2]), Transformation([0, 0, 2]))
+        candidates = [Transformation([0, 1, 2]), Transformation([1, 1, 2]),
+                      Transformation([2, 1, 0]), Transformation([0, 0, 0])]
+        self.assertEqual(S.contains_many(candidates).tolist(),
+                         [x in S for x in candidates])
+        self.assertEqual(S.contains_many(candidates).tolist(),
+                         [True, True, False, False])
+        self.assertEqual(S.contains_many(numpy.array([list(x)
+                                                      for x in candidates]))
+                         .tolist(), [True, True, False, False])
+        self.assertEqual(S.contains_many([]).tolist(), [])
+        self.assertEqual(S.contains_many([Transformation([0, 1])]).tolist(),
+                         [False])
+        with self.assertRaises(TypeError):
+            S.contains_many([PartialPerm([0], [1], 3)])
+        with self.assertRaises(ValueError):
+            S.contains_many([[0, 1, 3]])
+
+        S = Semigroup(Bipartition([1, -1], [2, -2]),
+                      Bipartition([1, 2], [-1, -2]))
+        self.assertEqual(S.contains_many(S.elements_array()).tolist(),
+                         [True] * S.size())
+        self.assertEqual(S.contains_many([[0, 1, 1, 0]]).tolist(), [False])
+        with self.assertRaises(ValueError):
+            S.contains_many([[1, 0, 1, 0]])
+
+        S = Semigroup(BooleanMat([0, 1], [1, 0]), BooleanMat([1, 1], [0, 1]))
+        self.assertEqual(S.contains_many(S.elements_array()).tolist(),
+                         [True] * S.size())
+
+    def test_factorisations(self):
+        S = FullTransformationMonoid(4)
+        words, offsets = S.factorisations()
+        self.assertEqual(words.dtype, numpy.uint32)
+        self.assertEqual(offsets.dtype, numpy.uint64)
+        self.assertEqual(len(offsets), 257)
+        for i, x in enumerate(S):
+            word = words[offsets[i]:offsets[i + 1]].tolist()
+            self.assertEqual(word, S.factorisation(x))
+
+        x, y = S[100], S[7]
+        words, offsets = S.factorisations([x, y])
+        self.assertEqual(words.tolist(),
+                         S.factorisation(x) + S.factorisation(y))
+        words, offsets = S.factorisations([100, 7])
+        self.assertEqual(words.tolist(),
+                         S.factorisation(x) + S.factorisation(y))
+        positions = numpy.array([100, 7])
+        positions.flags.writeable = False
+        self.assertEqual(S.factorisations(positions)[0].tolist(),
+                         words.tolist())
+
+        words, offsets = S.factorisations([])
+        self.assertEqual((words.tolist(), offsets.tolist()), ([], [0]))
+
+        with self.assertRaises(ValueError):
+            S.factorisations([256])
+        with self.assertRaises(ValueError):
+            S.factorisations([Transformation([0, 1, 2])])
+        with self.assertRaises(TypeError):
+            S.factorisations([PartialPerm([0], [1], 4)])
+
+    def test_word_arrays(self):
+        S = FullTransformationMonoid(4)
+        elements, gens = list(S), S.nrgens()
+        prefixes, suffixes = S.prefixes(), S.suffixes()
+        first, final = S.first_letters(), S.final_letters()
+        lengths = S.word_lengths()
+        undefined = numpy.iinfo(numpy.uint32).max
+        for array in (prefixes, suffixes, first, final, lengths):
+            self.assertEqual(array.shape, (256,))
+            self.assertEqual(array.dtype, numpy.uint32)
+        self.assertEqual(prefixes[:gens].tolist(), [undefined] * gens)
+        self.assertEqual(suffixes[:gens].tolist(), [undefined] * gens)
+        for i, x in enumerate(elements):
+            word = S.factorisation(x)
+            self.assertEqual(lengths[i], len(word))
+            self.assertEqual(first[i], word[0])
+            self.assertEqual(final[i], word[-1])
+            if i >= gens:
+                self.assertEqual(elements[prefixes[i]] * elements[final[i]],
+                                 x)
+                self.assertEqual(elements[first[i]] * elements[suffixes[i]],
+                                 x)
+
+    def test_evaluate(self):
+        S = FullTransformationMonoid(4)
+        words, offsets = S.factorisations()
+        self.assertEqual(S.evaluate_many(words, offsets).tolist(),
+                         list(range(256)))
+        self.assertEqual(S.evaluate_many(words, offsets).dtype, numpy.uint32)
+        self.assertEqual(S.evaluate(S.factorisation(S[100])), 100)
+        self.assertEqual(S.evaluate_many([], [0]).tolist(), [])
+
+        S = FullTransformationMonoid(6)
+        gens = [S[i] for i in range(S.nrgens())]
+        words = [[0, 1, 2], [2, 2, 1, 0], [1], [2, 1, 2, 1, 0]]
+        offsets = numpy.cumsum([0] + [len(word) for word in words])
+        positions = S.evaluate_many([a for word in words for a in word],
+                                    offsets)
+        for word, pos in zip(words, positions):
+            x = gens[word[0]]
+            for a in word[1:]:
+                x = x * gens[a]
+            self.assertEqual(S[pos], x)
+
+        with self.assertRaises(ValueError):
+            S.evaluate([])
+        with self.assertRaises(ValueError):
+            S.evaluate([0, 3])
+        with self.assertRaises(ValueError):
+            S.evaluate_many([0, 1], [0, 1])
+
+        # the GIL is kept while evaluating words in wrapped Python objects
+        S = Semigroup([1j])
+        self.assertEqual(S.evaluate_many([0, 0, 0, 0, 0], [0, 1, 3, 5])
+                         .tolist(), [0, 1, 1])
+
+    def test_products(self):
+        S = Semigroup(Transformation([1, 2, 0, 3]),
+                      Transformation([1, 0, 2, 3]),
+                      Transformation([0, 1, 2, 2]))
+        elements = list(S)
+        table = S.multiplication_table()
+        self.assertEqual(table.shape, (len(elements), len(elements)))
+        self.assertEqual(table.dtype, numpy.uint32)
+        for i, x in enumerate(elements):
+            for j, y in enumerate(elements):
+                self.assertEqual(elements[table[i, j]], x * y)
+        self.assertEqual(S.product_by_position(5, 7), table[5, 7])
+
+        lefts = numpy.arange(len(elements))
+        self.assertEqual(S.products(lefts[:, None], lefts).tolist(),
+                         table.tolist())
+        self.assertEqual(S.products(lefts, 3).tolist(),
+                         table[:, 3].tolist())
+        self.assertEqual(S.products([], []).tolist(), [])
+
+        path = os.path.join(tempfile.mkdtemp(), 'table.npy')
+        self.assertEqual(S.multiplication_table(path).tolist(),
+                         table.tolist())
+        self.assertEqual(numpy.load(path, mmap_mode='r').tolist(),
+                         table.tolist())
+
+        self.assertEqual(Semigroup([1j]).products([1, 2], [1, 1]).tolist(),
+                         [3, 0])
+        with self.assertRaises(ValueError):
+            S.product_by_position(len(elements), 0)
+        with self.assertRaises(ValueError):
+            S.products([0, 1], [-1, 0])
+        with self.assertRaises(ValueError):
+            S.products([0, 1], [0, 1, 2])
+
+    def test_greens_classes(self):
+        # in a full transformation monoid, two elements are R-related if they
+        # have the same kernel, L-related if they have the same image, and
+        # D-related if they have the same rank
+        def labels(keys):
+            index = {}
+            return [index.setdefault(key, len(index)) for key in keys]
+
+        S = FullTransformationMonoid(4)
+        elements = list(S)
+        kernels = [tuple(normalise_labels(list(x)).tolist())
+                   for x in elements]
+        images = [frozenset(x) for x in elements]
+        r_classes, l_classes = S.r_classes(), S.l_classes()
+        h_classes, d_classes = S.h_classes(), S.d_classes()
+        for array in (r_classes, l_classes, h_classes, d_classes):
+            self.assertEqual(array.shape, (256,))
+            self.assertEqual(array.dtype, numpy.uint32)
+        self.assertEqual(r_classes.tolist(), labels(kernels))
+        self.assertEqual(l_classes.tolist(), labels(images))
+        self.assertEqual(h_classes.tolist(), labels(zip(kernels, images)))
+        self.assertEqual(d_classes.tolist(),
+                         labels(len(image) for image in images))
+
+        self.assertEqual(Semigroup([1j]).h_classes().tolist(), [0, 0, 0, 0])
+        S = Semigroup(Transformation([1, 0, 2]), Transformation([0, 0, 2]))
+        self.assertEqual(S.d_classes().tolist(), S.r_classes().tolist())
+
+    def test_idempotents(self):
+        S = FullTransformationMonoid(4)
+        elements = list(S)
+        mask = S.is_idempotent_mask()
+        self.assertEqual(mask.dtype, numpy.bool_)
+        self.assertEqual(mask.tolist(), [x * x == x for x in elements])
+        self.assertEqual(S.idempotents().tolist(),
+                         [i for i, x in enumerate(elements) if x * x == x])
+        self.assertEqual(S.idempotents().dtype, numpy.uint32)
+        self.assertEqual(len(S.idempotents()), S.nridempotents())
+
+        S = FullTransformationMonoid(5)
+        S.set_max_threads(4)
+        self.assertEqual(len(S.idempotents()), 196)
+        self.assertEqual(Semigroup([1j]).idempotents().tolist(), [3])
+
+
+if __name__ == '__main__':
+    unittest.main()